@@ -114,6 +114,33 @@ DATABASES = {
 }
 
 
+# Cache
+# Cached values (plan list, subscription limits, ...) are invalidated with
+# cache.delete(), which must reach every gunicorn worker, so production uses
+# Redis. Without REDIS_URL, a single-process dev server keeps a per-process
+# memory cache, and anything else runs uncached rather than serving values
+# another worker has already invalidated.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,18 @@
+# Generated manually for file_hash field
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatlog', '0010_uploadedpdf_page_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foundationdocument',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -212,6 +212,7 @@ class FoundationDocument(models.Model):
     description = models.TextField(blank=True)  # Brief description of the document
     effective_date = models.DateField(null=True, blank=True)
     file_size = models.BigIntegerField(default=0)  # in bytes
+    file_hash = models.CharField(max_length=64, unique=True, null=True, blank=True)  # SHA-256 of the PDF, for dedup
     chunks_count = models.IntegerField(default=0)
     status = models.CharField(
         max_length=20,
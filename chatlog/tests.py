@@ -1,3 +1,43 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .views import _split_regulation_text, _iter_regulation_chunks
+
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta')
+
+
+def _words(count):
+    return ' '.join(WORDS[i % len(WORDS)] for i in range(count))
+
+
+class SplitRegulationTextTests(SimpleTestCase):
+    def test_short_first_section_is_merged_into_next_chunk(self):
+        chunks = _split_regulation_text('abc\nPart x' + 'y' * 5000)
+        self.assertEqual([len(chunk) for chunk in chunks], [1500, 1500, 1500, 510])
+        self.assertTrue(chunks[0].startswith('abc\nPart x'))
+
+    def test_short_intro_is_not_repeated(self):
+        chunks = _split_regulation_text('Intro para\n\n' + _words(2000))
+        self.assertTrue(chunks[0].startswith('Intro para'))
+        self.assertFalse(any('ntro para' in chunk for chunk in chunks[1:]))
+
+    def test_overlap_starts_on_word_boundary(self):
+        text = _words(2000)
+        chunks = _split_regulation_text(text)
+        self.assertGreater(len(chunks), 1)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertIn(chunk.split(' ')[0], WORDS)
+            # The overlap repeats the tail of the previous chunk
+            self.assertIn(chunk[:50], previous)
+
+    def test_overlap_starts_on_section_boundary(self):
+        text = _words(220) + '\n§ 75.1 ' + _words(20) + '\n§ 75.2 ' + _words(400)
+        chunks = _split_regulation_text(text)
+        self.assertTrue(chunks[0].endswith(_words(20)))
+        self.assertTrue(chunks[1].startswith('§ 75.1'))
+
+    def test_streaming_matches_full_text(self):
+        text = ('Intro\n\n' + _words(300) + '\nPart 75 ' + _words(700)
+                + '\n§ 75.1 ' + 'y' * 2000 + '\nSubpart B ' + _words(500))
+        pieces = [text[i:i + 333] for i in range(0, len(text), 333)]
+        self.assertEqual(list(_iter_regulation_chunks(pieces)), _split_regulation_text(text))
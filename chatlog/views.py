@@ -5,13 +5,17 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.views.decorators.http import require_http_methods
 from .decorators import require_staff
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Sum
 from django.utils.timezone import now
 from django.conf import settings
 
 from langchain_core.messages import HumanMessage, AIMessage
 
 import os
+import re
+import bisect
+import collections
 import json
 import tempfile
 import shutil
@@ -58,10 +62,22 @@ def get_or_create_agent_graph(collection_name):
 def get_authenticated_user(request):
     """
     Get authenticated User from JWT token in cookies or Authorization header.
+    The result is cached on the request so helpers that each resolve the user
+    (is_admin_user, get_user_knowledge_base, ...) cost a single DB lookup.
 
     Returns:
         User or None: The authenticated user if token is valid, None otherwise
     """
+    if hasattr(request, '_cached_auth_user'):
+        return request._cached_auth_user
+
+    user = _resolve_authenticated_user(request)
+    request._cached_auth_user = user
+    return user
+
+
+def _resolve_authenticated_user(request):
+    """Validate the request's JWT and load its User (uncached)."""
     from rest_framework_simplejwt.tokens import AccessToken
     from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
     from accounts.models import User
@@ -181,6 +197,75 @@ except ImportError:
     DOCLING_AVAILABLE = False
     print("[PDF Parser] Docling not available - falling back to PyPDFLoader")
 
+# Persistent Docling workers: the pool threads live for the whole process and
+# each keeps its own DocumentConverter, so the ML models load once per thread
+# instead of once per PDF.
+import concurrent.futures
+
+DOCLING_WORKERS = 2
+# Seconds a conversion may wait for a free worker before it is given up
+DOCLING_QUEUE_TIMEOUT = 300
+
+_DOCLING_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=DOCLING_WORKERS, thread_name_prefix="docling")
+_docling_local = threading.local()
+
+# Conversions still running after their caller timed out; a thread cannot be
+# stopped, so each one holds a worker until it finishes
+_docling_lock = threading.Lock()
+_docling_abandoned = 0
+
+
+def _docling_to_markdown(file_path):
+    """Convert a PDF to markdown with this worker thread's cached converter."""
+    converter = getattr(_docling_local, "converter", None)
+    if converter is None:
+        converter = DocumentConverter()
+        _docling_local.converter = converter
+    result = converter.convert(str(file_path))
+    return result.document.export_to_markdown()
+
+
+def _docling_job(file_path, started):
+    started.set()
+    return _docling_to_markdown(file_path)
+
+
+def _docling_released(future):
+    global _docling_abandoned
+    with _docling_lock:
+        _docling_abandoned -= 1
+    print("[PDF Parser] Timed-out Docling conversion finished; worker released")
+
+
+def _docling_convert(file_path, timeout):
+    """
+    Convert a PDF to markdown on the Docling pool. The timeout counts from
+    when a worker starts the conversion, not from submission, so time spent
+    queued behind other PDFs is not charged to it.
+
+    Raises concurrent.futures.TimeoutError if the job waits longer than
+    DOCLING_QUEUE_TIMEOUT for a worker or runs longer than timeout, and
+    RuntimeError while every worker is stuck on a timed-out conversion.
+    """
+    global _docling_abandoned
+    with _docling_lock:
+        if _docling_abandoned >= DOCLING_WORKERS:
+            print(f"[PDF Parser] All {DOCLING_WORKERS} Docling workers are stuck on timed-out conversions; refusing {file_path}")
+            raise RuntimeError("all Docling workers are busy with timed-out conversions")
+
+    started = threading.Event()
+    future = _DOCLING_POOL.submit(_docling_job, file_path, started)
+    if not started.wait(DOCLING_QUEUE_TIMEOUT) and future.cancel():
+        raise concurrent.futures.TimeoutError(f"no Docling worker free after {DOCLING_QUEUE_TIMEOUT}s")
+
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        with _docling_lock:
+            _docling_abandoned += 1
+        future.add_done_callback(_docling_released)
+        raise
+
 # PyMuPDF as fallback for corrupted/malformed PDFs
 try:
     import fitz  # PyMuPDF
@@ -344,30 +429,22 @@ def process_pdf_background(pdf_id, file_path, filename, collection_name):
 
         # 3. Final fallback to Docling (slow but handles complex layouts)
         if not documents and DOCLING_AVAILABLE:
-            import concurrent.futures
             DOCLING_TIMEOUT = 30  # Reduced from 60
 
-            def parse_with_docling(fp):
-                converter = DocumentConverter()
-                result = converter.convert(str(fp))
-                return result.document.export_to_markdown()
-
             try:
                 print(f"[PDF Processing] Using Docling (complex PDF) for: {filename}")
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(parse_with_docling, file_path)
-                    try:
-                        markdown_content = future.result(timeout=DOCLING_TIMEOUT)
-                        if markdown_content and len(markdown_content.strip()) > 0:
-                            documents = [Document(
-                                page_content=markdown_content,
-                                metadata={"source": str(file_path), "filename": filename, "parser": "docling"}
-                            )]
-                            parser_used = "docling"
-                            print(f"[PDF Processing] Docling extracted {len(markdown_content)} characters")
-                    except concurrent.futures.TimeoutError:
-                        print(f"[PDF Processing] Docling timeout after {DOCLING_TIMEOUT}s")
-                        documents = []
+                try:
+                    markdown_content = _docling_convert(file_path, DOCLING_TIMEOUT)
+                    if markdown_content and len(markdown_content.strip()) > 0:
+                        documents = [Document(
+                            page_content=markdown_content,
+                            metadata={"source": str(file_path), "filename": filename, "parser": "docling"}
+                        )]
+                        parser_used = "docling"
+                        print(f"[PDF Processing] Docling extracted {len(markdown_content)} characters")
+                except concurrent.futures.TimeoutError:
+                    print(f"[PDF Processing] Docling timeout after {DOCLING_TIMEOUT}s")
+                    documents = []
             except Exception as e:
                 print(f"[PDF Processing] Docling failed: {e}")
                 documents = []
@@ -1652,6 +1729,10 @@ def get_feedback_stats(request):
 # FOUNDATION KNOWLEDGE BASE ADMIN ENDPOINTS
 # ===================================
 
+# Category value -> display label, so list/stats rows can be built from values()
+FOUNDATION_CATEGORY_DISPLAY = dict(FoundationDocument.CATEGORY_CHOICES)
+
+
 def is_admin_user(request):
     """
     Check if the authenticated user is an admin.
@@ -1668,68 +1749,231 @@ def is_admin_user(request):
     return True, auth_user, None
 
 
+# Regulation structure markers (CFR section, Section/Part/Subpart headers) and
+# paragraph breaks, located in a single regex pass over the document.
+_REG_BOUND_RE = re.compile(r'\n(?:§|Section |Part |Subpart |\n)')
+_CFR_RE = re.compile(r'(\d+ CFR [\d\.]+)')
+_SECTION_RE = re.compile(r'§\s*([\d\.]+)')
+
+
+# Longest boundary marker after the newline ("Subpart "); a streaming window
+# needs this much text past its end before the boundary scan is reliable.
+_REG_BOUND_LOOKAHEAD = 8
+
+_SAFETY_KEYWORDS = ('hazard', 'ppe', 'training', 'inspection',
+                    'ventilation', 'ground control', 'electrical',
+                    'explosive', 'blasting', 'dust', 'noise',
+                    'fire', 'emergency', 'rescue', 'methane',
+                    'roof', 'rib', 'haulage', 'hoisting')
+
+
+def _pack_regulation_text(text, chunk_size, chunk_overlap, prev_end=0, final=True):
+    """
+    Greedily pack text between regulation boundaries into chunks of at most
+    chunk_size characters, overlapping consecutive chunks by up to
+    chunk_overlap. Falls back to the last space (or a hard cut) when no
+    boundary fits. A chunk only ends early past its first chunk_overlap
+    characters, so a short leading piece is merged into the chunk after it,
+    and the overlap starts on a boundary or word, never mid-word.
+
+    With final=False, stops before any window that would run past the end of
+    text, so more text can be appended and packing resumed.
+    Returns (chunks, consumed, prev_end) where consumed is the offset the
+    next call should resume from.
+    """
+    text_len = len(text)
+    boundaries = [m.start() for m in _REG_BOUND_RE.finditer(text)]
+
+    chunks = []
+    start = 0
+    while start < text_len:
+        if not final and start + chunk_size + _REG_BOUND_LOOKAHEAD >= text_len:
+            break
+
+        end = min(start + chunk_size, text_len)
+        if end < text_len:
+            # Furthest boundary inside the window that still makes progress
+            # and leaves a chunk longer than the overlap
+            earliest = max(prev_end, start + chunk_overlap)
+            idx = bisect.bisect_right(boundaries, end) - 1
+            if idx >= 0 and boundaries[idx] > earliest:
+                end = boundaries[idx]
+            else:
+                space = text.rfind(' ', earliest + 1, end)
+                if space != -1:
+                    end = space
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= text_len:
+            start = text_len
+            break
+
+        prev_end = end
+        start = _overlap_start(text, boundaries, end, chunk_overlap)
+
+    return chunks, start, prev_end
+
+
+def _overlap_start(text, boundaries, end, chunk_overlap):
+    """
+    Where the chunk after one ending at end starts: the first boundary, else
+    the first word, within the last chunk_overlap characters; with neither,
+    the next chunk starts at end without overlap.
+    """
+    lo = max(end - chunk_overlap, 0)
+    idx = bisect.bisect_left(boundaries, lo)
+    if idx < len(boundaries) and boundaries[idx] < end:
+        return boundaries[idx]
+
+    space = text.find(' ', lo, end)
+    if space != -1:
+        return space + 1
+    return end
+
+
+def _split_regulation_text(text, chunk_size=1500, chunk_overlap=300):
+    """Chunk a complete regulation text (see _pack_regulation_text)."""
+    return _pack_regulation_text(text, chunk_size, chunk_overlap)[0]
+
+
+def _iter_regulation_chunks(pieces, chunk_size=1500, chunk_overlap=300):
+    """
+    Chunk an iterable of text pieces (e.g. PDF pages) incrementally, yielding
+    each chunk as soon as enough text has arrived. Produces the same chunks as
+    _split_regulation_text on the joined pieces without materializing them.
+    """
+    buffer = ""
+    prev_end = 0
+    for piece in pieces:
+        buffer += piece
+        chunks, consumed, prev_end = _pack_regulation_text(
+            buffer, chunk_size, chunk_overlap, prev_end, final=False
+        )
+        yield from chunks
+        buffer = buffer[consumed:]
+        prev_end -= consumed
+
+    yield from _pack_regulation_text(buffer, chunk_size, chunk_overlap, prev_end)[0]
+
+
+def _enrich_regulation_chunk(chunk, metadata):
+    """Attach the CFR codes, section numbers and safety topics found in a chunk."""
+    chunk_metadata = metadata.copy()
+
+    # Extract CFR references
+    cfr_matches = _CFR_RE.findall(chunk)
+    if cfr_matches:
+        chunk_metadata['cfr_codes'] = cfr_matches
+
+    # Extract section numbers
+    section_matches = _SECTION_RE.findall(chunk)
+    if section_matches:
+        chunk_metadata['sections'] = section_matches
+
+    # Identify topic keywords for mining safety
+    chunk_lower = chunk.lower()
+    found_keywords = [kw for kw in _SAFETY_KEYWORDS if kw in chunk_lower]
+    if found_keywords:
+        chunk_metadata['topics'] = found_keywords
+
+    return {
+        'content': chunk,
+        'metadata': chunk_metadata
+    }
+
+
 def smart_chunk_regulation(text, filename, metadata=None):
     """
     Intelligent chunking for regulation documents.
     Uses larger chunks and smarter separators for legal/regulatory text.
     """
-    import re
-
     if metadata is None:
         metadata = {}
 
-    # For regulations: Use larger chunks with semantic separators
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1500,  # Larger chunks for regulations
-        chunk_overlap=300,
-        separators=[
-            "\n§",           # CFR section marker
-            "\nSection ",    # Section headers
-            "\nPart ",       # Part headers
-            "\nSubpart ",    # Subpart headers
-            "\n\n\n",        # Triple newline (major breaks)
-            "\n\n",          # Paragraphs
-            "\n",
-            ". ",            # Sentences
-            " "
-        ]
-    )
-
-    chunks = splitter.split_text(text)
+    # For regulations: Use larger chunks split on semantic boundaries
+    chunks = _split_regulation_text(text, chunk_size=1500, chunk_overlap=300)
 
     # Extract regulation metadata from each chunk
-    enriched_chunks = []
-    for chunk in chunks:
-        chunk_metadata = metadata.copy()
-
-        # Extract CFR references
-        cfr_pattern = r'(\d+ CFR [\d\.]+)'
-        cfr_matches = re.findall(cfr_pattern, chunk)
-        if cfr_matches:
-            chunk_metadata['cfr_codes'] = cfr_matches
-
-        # Extract section numbers
-        section_pattern = r'§\s*([\d\.]+)'
-        section_matches = re.findall(section_pattern, chunk)
-        if section_matches:
-            chunk_metadata['sections'] = section_matches
-
-        # Identify topic keywords for mining safety
-        safety_keywords = ['hazard', 'ppe', 'training', 'inspection',
-                           'ventilation', 'ground control', 'electrical',
-                           'explosive', 'blasting', 'dust', 'noise',
-                           'fire', 'emergency', 'rescue', 'methane',
-                           'roof', 'rib', 'haulage', 'hoisting']
-        found_keywords = [kw for kw in safety_keywords if kw in chunk.lower()]
-        if found_keywords:
-            chunk_metadata['topics'] = found_keywords
-
-        enriched_chunks.append({
-            'content': chunk,
-            'metadata': chunk_metadata
-        })
+    return [_enrich_regulation_chunk(chunk, metadata) for chunk in chunks]
+
+
+def _iter_pdf_page_texts(file_path):
+    """Yield the text of each PDF page with PyMuPDF, one page at a time."""
+    with fitz.open(str(file_path)) as pdf_doc:
+        for page in pdf_doc:
+            yield page.get_text()
+
+
+def _embed_regulation_pages(pages, vectorstore, metadata, min_chars=0, batch_size=16, max_pending=4):
+    """
+    Pipeline page texts through regulation chunking and embedding.
 
-    return enriched_chunks
+    Chunks are built as pages arrive and added to the vector store in batches
+    on a worker thread, so parsing overlaps with embedding. At most
+    max_pending batches are in flight before the parser waits.
+
+    Returns the number of chunks added, or 0 (nothing embedded) when the
+    pages hold fewer than min_chars characters of text.
+    """
+    text_chars = 0
+
+    def counted_pages():
+        nonlocal text_chars
+        for text in pages:
+            text_chars += len(text.strip())
+            yield text + "\n\n"
+
+    chunks_count = 0
+    batch = []
+    pending = collections.deque()
+
+    def submit(embedder, batch):
+        pending.append(embedder.submit(
+            vectorstore.add_texts,
+            texts=[chunk['content'] for chunk in batch],
+            metadatas=[chunk['metadata'] for chunk in batch]
+        ))
+        if len(pending) >= max_pending:
+            pending.popleft().result()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="foundation-embed") as embedder:
+        for chunk in _iter_regulation_chunks(counted_pages()):
+            batch.append(_enrich_regulation_chunk(chunk, metadata))
+            chunks_count += 1
+            if len(batch) >= batch_size:
+                submit(embedder, batch)
+                batch = []
+
+        # Batches only go out once far more than min_chars has been read,
+        # so a near-empty document never reaches the embedder
+        if text_chars < min_chars:
+            return 0
+
+        if batch:
+            submit(embedder, batch)
+        while pending:
+            pending.popleft().result()
+
+    return chunks_count
+
+
+def _delete_foundation_vectors(doc_id):
+    """Delete all Foundation KB vector chunks of a document. Returns the row count."""
+    from django.db import connection
+
+    delete_query = """
+        DELETE FROM langchain_pg_embedding
+        WHERE collection_id = (
+            SELECT uuid FROM langchain_pg_collection
+            WHERE name = %s
+        )
+        AND cmetadata->>'foundation_doc_id' = %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(delete_query, [FOUNDATION_COLLECTION, str(doc_id)])
+        return cursor.rowcount
 
 
 def process_foundation_pdf_background(doc_id, file_path, filename, category, regulation_code):
@@ -1742,38 +1986,45 @@ def process_foundation_pdf_background(doc_id, file_path, filename, category, reg
     try:
         print(f"[Foundation KB] Starting background processing for: {filename}")
 
-        # Update status to processing
-        foundation_doc = FoundationDocument.objects.get(id=doc_id)
-        foundation_doc.status = 'processing'
-        foundation_doc.save()
+        # Update status to processing (targeted UPDATE, no full-row write)
+        foundation_docs = FoundationDocument.objects.filter(pk=doc_id)
+        foundation_docs.update(status='processing', updated_at=now())
+
+        base_metadata = {
+            'filename': filename,
+            'category': category,
+            'regulation_code': regulation_code,
+            'foundation_doc_id': str(doc_id),
+            'is_foundation': True
+        }
+        foundation_vs = get_foundation_vectorstore()
 
+        chunks_count = 0
         documents = []
         parser_used = "pypdf"
 
-        # 1. Try PyMuPDF first (fastest)
+        # 1. Try PyMuPDF first (fastest). Pages stream straight into chunking
+        # and embedding, so embedding starts before the whole PDF is parsed.
         if PYMUPDF_AVAILABLE:
             try:
                 print(f"[Foundation KB] Trying PyMuPDF for: {filename}")
-                pdf_doc = fitz.open(str(file_path))
-                full_text = ""
-                for page_num in range(len(pdf_doc)):
-                    page = pdf_doc[page_num]
-                    full_text += page.get_text() + "\n\n"
-                pdf_doc.close()
-
-                if full_text.strip() and len(full_text.strip()) > 100:
-                    documents = [Document(
-                        page_content=full_text,
-                        metadata={"source": str(file_path), "filename": filename, "parser": "pymupdf"}
-                    )]
+                chunks_count = _embed_regulation_pages(
+                    _iter_pdf_page_texts(file_path),
+                    foundation_vs,
+                    {**base_metadata, 'parser': 'pymupdf'},
+                    min_chars=100
+                )
+                if chunks_count:
                     parser_used = "pymupdf"
-                    print(f"[Foundation KB] PyMuPDF extracted {len(full_text)} characters")
+                    print(f"[Foundation KB] PyMuPDF embedded {chunks_count} chunks")
             except Exception as e:
                 print(f"[Foundation KB] PyMuPDF failed: {e}")
-                documents = []
+                # Drop any batches embedded before the failure; a fallback re-adds them
+                _delete_foundation_vectors(doc_id)
+                chunks_count = 0
 
         # 2. Fallback to PyPDFLoader
-        if not documents:
+        if not chunks_count:
             try:
                 print(f"[Foundation KB] Trying PyPDFLoader for: {filename}")
                 loader = PyPDFLoader(str(file_path))
@@ -1785,88 +2036,76 @@ def process_foundation_pdf_background(doc_id, file_path, filename, category, reg
                 documents = []
 
         # 3. Fallback to Docling for complex layouts
-        if not documents and DOCLING_AVAILABLE:
-            import concurrent.futures
+        if not chunks_count and not documents and DOCLING_AVAILABLE:
             DOCLING_TIMEOUT = 60
 
-            def parse_with_docling(fp):
-                converter = DocumentConverter()
-                result = converter.convert(str(fp))
-                return result.document.export_to_markdown()
-
             try:
                 print(f"[Foundation KB] Using Docling for: {filename}")
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(parse_with_docling, file_path)
-                    try:
-                        markdown_content = future.result(timeout=DOCLING_TIMEOUT)
-                        if markdown_content and len(markdown_content.strip()) > 0:
-                            documents = [Document(
-                                page_content=markdown_content,
-                                metadata={"source": str(file_path), "filename": filename, "parser": "docling"}
-                            )]
-                            parser_used = "docling"
-                            print(f"[Foundation KB] Docling extracted {len(markdown_content)} characters")
-                    except concurrent.futures.TimeoutError:
-                        print(f"[Foundation KB] Docling timeout")
-                        documents = []
+                try:
+                    markdown_content = _docling_convert(file_path, DOCLING_TIMEOUT)
+                    if markdown_content and len(markdown_content.strip()) > 0:
+                        documents = [Document(
+                            page_content=markdown_content,
+                            metadata={"source": str(file_path), "filename": filename, "parser": "docling"}
+                        )]
+                        parser_used = "docling"
+                        print(f"[Foundation KB] Docling extracted {len(markdown_content)} characters")
+                except concurrent.futures.TimeoutError:
+                    print(f"[Foundation KB] Docling timeout")
+                    documents = []
             except Exception as e:
                 print(f"[Foundation KB] Docling failed: {e}")
                 documents = []
 
-        if not documents:
-            foundation_doc.status = 'failed'
-            foundation_doc.error_message = 'No text could be extracted from this PDF'
-            foundation_doc.save()
-            print(f"[Foundation KB] Failed - no text extracted: {filename}")
-            return
-
-        # Combine all document content
-        full_text = "\n\n".join([doc.page_content for doc in documents])
-
-        if len(full_text.strip()) < 50:
-            foundation_doc.status = 'failed'
-            foundation_doc.error_message = 'PDF appears to be empty or contains no readable text'
-            foundation_doc.save()
-            print(f"[Foundation KB] Failed - content too short: {filename}")
-            return
-
-        # Smart chunking for regulations
-        base_metadata = {
-            'filename': filename,
-            'category': category,
-            'regulation_code': regulation_code,
-            'foundation_doc_id': str(doc_id),
-            'parser': parser_used,
-            'is_foundation': True
-        }
-
-        print(f"[Foundation KB] Smart chunking regulation document...")
-        enriched_chunks = smart_chunk_regulation(full_text, filename, base_metadata)
-        print(f"[Foundation KB] Created {len(enriched_chunks)} enriched chunks")
+        if not chunks_count:
+            if not documents:
+                foundation_docs.update(
+                    status='failed',
+                    error_message='No text could be extracted from this PDF',
+                    updated_at=now()
+                )
+                print(f"[Foundation KB] Failed - no text extracted: {filename}")
+                return
+
+            # Smart chunking for regulations, embedded batch by batch
+            print(f"[Foundation KB] Smart chunking regulation document...")
+            chunks_count = _embed_regulation_pages(
+                (doc.page_content for doc in documents),
+                foundation_vs,
+                {**base_metadata, 'parser': parser_used},
+                min_chars=50
+            )
 
-        # Add to Foundation KB vector store
-        texts = [chunk['content'] for chunk in enriched_chunks]
-        metadatas = [chunk['metadata'] for chunk in enriched_chunks]
+            if not chunks_count:
+                foundation_docs.update(
+                    status='failed',
+                    error_message='PDF appears to be empty or contains no readable text',
+                    updated_at=now()
+                )
+                print(f"[Foundation KB] Failed - content too short: {filename}")
+                return
 
-        foundation_vs = get_foundation_vectorstore()
-        foundation_vs.add_texts(texts=texts, metadatas=metadatas)
+        print(f"[Foundation KB] Added {chunks_count} enriched chunks")
 
         # Update document record
-        foundation_doc.chunks_count = len(enriched_chunks)
-        foundation_doc.status = 'completed'
-        foundation_doc.save()
+        foundation_docs.update(
+            status='completed',
+            chunks_count=chunks_count,
+            updated_at=now()
+        )
 
-        print(f"[Foundation KB] Completed: {filename} - {len(enriched_chunks)} chunks, parser: {parser_used}")
+        print(f"[Foundation KB] Completed: {filename} - {chunks_count} chunks, parser: {parser_used}")
 
     except Exception as e:
         print(f"[Foundation KB] Error: {e}")
         traceback.print_exc()
         try:
-            foundation_doc = FoundationDocument.objects.get(id=doc_id)
-            foundation_doc.status = 'failed'
-            foundation_doc.error_message = str(e)
-            foundation_doc.save()
+            _delete_foundation_vectors(doc_id)
+            FoundationDocument.objects.filter(pk=doc_id).update(
+                status='failed',
+                error_message=str(e),
+                updated_at=now()
+            )
         except:
             pass
 
@@ -1924,23 +2163,54 @@ def upload_foundation_pdf(request):
         unique_filename = f"{uuid.uuid4()}_{filename}"
         pdf_file_path = foundation_dir / unique_filename
 
-        # Save PDF file
+        # Save PDF file, hashing the same chunks for duplicate detection
+        import hashlib
+        file_hasher = hashlib.sha256()
         with open(pdf_file_path, 'wb') as destination:
             for chunk in pdf_file.chunks():
+                file_hasher.update(chunk)
                 destination.write(chunk)
+        file_hash = file_hasher.hexdigest()
+
+        # Skip re-parsing and re-embedding a PDF that is already in the Foundation KB.
+        # Failed uploads release their hash so the same file can be retried.
+        FoundationDocument.objects.filter(file_hash=file_hash, status='failed').update(file_hash=None)
+        existing = FoundationDocument.objects.filter(file_hash=file_hash).first()
+        if existing:
+            pdf_file_path.unlink(missing_ok=True)
+            return JsonResponse({
+                "message": "duplicate",
+                "document_id": existing.id,
+                "title": existing.title,
+                "filename": existing.filename,
+                "status": existing.status
+            })
 
         # Create FoundationDocument record
         relative_path = f"foundation_kb/{unique_filename}"
-        foundation_doc = FoundationDocument.objects.create(
-            title=title,
-            filename=filename,
-            file_path=relative_path,
-            category=category,
-            regulation_code=regulation_code,
-            description=description,
-            file_size=file_size,
-            status='processing'
-        )
+        try:
+            foundation_doc = FoundationDocument.objects.create(
+                title=title,
+                filename=filename,
+                file_path=relative_path,
+                category=category,
+                regulation_code=regulation_code,
+                description=description,
+                file_size=file_size,
+                file_hash=file_hash,
+                status='processing'
+            )
+        except IntegrityError:
+            # Same file uploaded concurrently; the other request owns processing
+            pdf_file_path.unlink(missing_ok=True)
+            existing = FoundationDocument.objects.get(file_hash=file_hash)
+            return JsonResponse({
+                "message": "duplicate",
+                "document_id": existing.id,
+                "title": existing.title,
+                "filename": existing.filename,
+                "status": existing.status
+            })
 
         # Start background processing
         thread = threading.Thread(
@@ -2008,32 +2278,40 @@ def list_foundation_documents(request):
         # Apply pagination
         start = (page - 1) * page_size
         end = start + page_size
-        paginated_docs = documents[start:end]
+        paginated_docs = documents.values(
+            'id', 'title', 'filename', 'category', 'regulation_code', 'description',
+            'file_size', 'chunks_count', 'status', 'error_message', 'is_active',
+            'created_at', 'updated_at'
+        )[start:end]
 
         docs_data = [{
-            'id': doc.id,
-            'title': doc.title,
-            'filename': doc.filename,
-            'category': doc.category,
-            'category_display': doc.get_category_display(),
-            'regulation_code': doc.regulation_code,
-            'description': doc.description,
-            'file_size': doc.file_size,
-            'chunks_count': doc.chunks_count,
-            'status': doc.status,
-            'error_message': doc.error_message,
-            'is_active': doc.is_active,
-            'uploaded_at': doc.created_at.isoformat(),
-            'updated_at': doc.updated_at.isoformat()
+            'id': doc['id'],
+            'title': doc['title'],
+            'filename': doc['filename'],
+            'category': doc['category'],
+            'category_display': FOUNDATION_CATEGORY_DISPLAY.get(doc['category'], doc['category']),
+            'regulation_code': doc['regulation_code'],
+            'description': doc['description'],
+            'file_size': doc['file_size'],
+            'chunks_count': doc['chunks_count'],
+            'status': doc['status'],
+            'error_message': doc['error_message'],
+            'is_active': doc['is_active'],
+            'uploaded_at': doc['created_at'].isoformat(),
+            'updated_at': doc['updated_at'].isoformat()
         } for doc in paginated_docs]
 
-        # Get summary stats (from all documents, not just paginated)
-        all_docs = FoundationDocument.objects.filter(is_active=True)
-        total_chunks = sum(doc.chunks_count for doc in all_docs if doc.status == 'completed')
+        # Get summary stats (from all documents, not just paginated), aggregated in the DB
+        category_rows = (
+            FoundationDocument.objects.filter(is_active=True, status='completed')
+            .values('category')
+            .annotate(count=Count('id'), chunks=Sum('chunks_count'))
+        )
+        total_chunks = 0
         categories_count = {}
-        for doc in all_docs:
-            if doc.status == 'completed':
-                categories_count[doc.category] = categories_count.get(doc.category, 0) + 1
+        for row in category_rows:
+            total_chunks += row['chunks'] or 0
+            categories_count[row['category']] = row['count']
 
         return JsonResponse({
             'documents': docs_data,
@@ -2076,20 +2354,8 @@ def delete_foundation_document(request, doc_id):
         # Delete vectors from pgvector
         vectors_deleted = 0
         try:
-            from django.db import connection
-
-            delete_query = """
-                DELETE FROM langchain_pg_embedding
-                WHERE collection_id = (
-                    SELECT uuid FROM langchain_pg_collection
-                    WHERE name = %s
-                )
-                AND cmetadata->>'foundation_doc_id' = %s
-            """
-            with connection.cursor() as cursor:
-                cursor.execute(delete_query, [FOUNDATION_COLLECTION, str(doc_id)])
-                vectors_deleted = cursor.rowcount
-                print(f"[Foundation KB] Deleted {vectors_deleted} vector chunks for doc ID {doc_id}")
+            vectors_deleted = _delete_foundation_vectors(doc_id)
+            print(f"[Foundation KB] Deleted {vectors_deleted} vector chunks for doc ID {doc_id}")
         except Exception as e:
             print(f"[Foundation KB] Warning: Could not clean vectors: {e}")
 
@@ -2329,20 +2595,22 @@ def get_foundation_stats(request):
     GET /chatlog/foundation/stats/
     """
     try:
-        # Get all completed Foundation documents (uploaded via admin)
-        documents = FoundationDocument.objects.filter(status='completed', is_active=True)
-
-        admin_docs = documents.count()
-        admin_chunks = sum(doc.chunks_count for doc in documents)
+        # Category breakdown of completed Foundation documents (uploaded via admin)
+        category_rows = (
+            FoundationDocument.objects.filter(status='completed', is_active=True)
+            .values('category')
+            .annotate(count=Count('id'), chunks=Sum('chunks_count'))
+        )
 
-        # Category breakdown from admin uploads
+        admin_docs = 0
+        admin_chunks = 0
         categories = {}
-        for doc in documents:
-            cat_display = doc.get_category_display()
-            if cat_display not in categories:
-                categories[cat_display] = {'count': 0, 'chunks': 0}
-            categories[cat_display]['count'] += 1
-            categories[cat_display]['chunks'] += doc.chunks_count
+        for row in category_rows:
+            cat_display = FOUNDATION_CATEGORY_DISPLAY.get(row['category'], row['category'])
+            chunks = row['chunks'] or 0
+            categories[cat_display] = {'count': row['count'], 'chunks': chunks}
+            admin_docs += row['count']
+            admin_chunks += chunks
 
         # Get ACTUAL chunk count and storage from vector database (includes KB builder uploads)
         db_chunks = 0
@@ -2399,8 +2667,11 @@ def get_db_stats(request):
     Admin endpoint: Get vector database statistics.
     GET /chatlog/admin/db-stats/
 
+    Query params: exact=1 to count chunks exactly instead of estimating
+
     Returns:
-    - total_chunks: Total number of vector chunks in database
+    - total_chunks: Total number of vector chunks in database (estimate unless exact=1)
+    - total_chunks_approx: Whether total_chunks is an estimate
     - db_size: Human-readable database size
     - collections: List of all vector collections
     - recent_chunks: Sample of recent chunks for debugging
@@ -2422,10 +2693,25 @@ def get_db_stats(request):
         }
 
         with connection.cursor() as cursor:
-            # 1. Total chunks in vector store
+            # 1. Total chunks in vector store. The planner's row estimate is an
+            # O(1) catalog lookup; ?exact=1 forces a full COUNT(*) scan.
             try:
-                cursor.execute("SELECT count(*) FROM langchain_pg_embedding")
-                stats["total_chunks"] = cursor.fetchone()[0]
+                total_chunks = None
+                if request.GET.get('exact') != '1':
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        ['langchain_pg_embedding']
+                    )
+                    row = cursor.fetchone()
+                    # reltuples is -1 until the table has been analyzed
+                    if row and row[0] >= 0:
+                        total_chunks = row[0]
+                        stats["total_chunks_approx"] = True
+                if total_chunks is None:
+                    cursor.execute("SELECT count(*) FROM langchain_pg_embedding")
+                    total_chunks = cursor.fetchone()[0]
+                    stats["total_chunks_approx"] = False
+                stats["total_chunks"] = total_chunks
             except Exception as e:
                 stats["total_chunks_error"] = str(e)
 
@@ -10,10 +10,14 @@ These are the actual law PDFs - the authoritative source for mining safety regul
 
 import os
 import sys
+import shutil
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Setup paths
 BASE_DIR = Path(__file__).parent
@@ -37,6 +41,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger("cfr_pdf_downloader")
 
+# Copy downloads in 1 MiB blocks (fewer read()/write() calls)
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# govinfo.gov comfortably serves a handful of parallel downloads
+MAX_PARALLEL_DOWNLOADS = 4
+
+# Shared HTTP session - keeps the govinfo.gov connection alive across volumes
+# and retries transient failures (429/5xx, dropped connections) with backoff
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mining Safety KB Builder/1.0"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    ),
+))
+
 # GovInfo CFR PDF URLs (2024 edition - most recent complete)
 # Format: https://www.govinfo.gov/content/pkg/CFR-{year}-title{num}-vol{vol}/pdf/CFR-{year}-title{num}-vol{vol}.pdf
 CFR_PDFS = {
@@ -60,30 +85,81 @@ CFR_PDFS = {
 }
 
 
+def _part_paths(filepath: Path):
+    """The ``.part`` file for a download and the file holding its validator."""
+    part_path = filepath.with_suffix(filepath.suffix + ".part")
+    return part_path, part_path.with_suffix(part_path.suffix + ".validator")
+
+
+def _response_validator(response):
+    """
+    The response's strong ETag, else its Last-Modified date, for If-Range;
+    None if it has neither (weak ETags cannot be used with If-Range).
+    """
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
 def download_pdf(url: str, filepath: Path) -> bool:
-    """Download a PDF file with progress."""
+    """
+    Download a PDF file.
+
+    Data goes to a sibling ``.part`` file that is renamed into place once
+    complete. If a ``.part`` file is left from an interrupted run, the
+    download resumes from its size with an HTTP Range request, sent with
+    If-Range and the ETag/Last-Modified saved when the ``.part`` was
+    started, so a newer copy on the server restarts the download instead of
+    being appended to the old bytes.
+    """
+    part_path, validator_path = _part_paths(filepath)
     try:
         logger.info(f"Downloading: {filepath.name}")
         logger.info(f"  URL: {url}")
 
-        response = requests.get(url, stream=True, timeout=120)
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        validator = validator_path.read_text().strip() if validator_path.exists() else ""
+        if offset and not validator:
+            # Nothing to tell whether the server copy changed - start over
+            logger.info("  Partial download has no validator, starting over")
+            offset = 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+        response = SESSION.get(url, stream=True, timeout=120, headers=headers)
+        if response.status_code == 416:
+            # Partial file is unusable for this server copy - start over
+            response.close()
+            offset = 0
+            response = SESSION.get(url, stream=True, timeout=120)
         response.raise_for_status()
 
-        total_size = int(response.headers.get('content-length', 0))
+        if offset and response.status_code == 206:
+            logger.info(f"  Resuming at {offset / 1024 / 1024:.1f} MB")
+            mode = 'ab'
+        else:
+            # Server ignored the Range header, or the file changed since the
+            # .part was started (200) - rewrite from scratch
+            offset = 0
+            mode = 'wb'
+            validator = _response_validator(response)
+            if validator:
+                validator_path.write_text(validator)
+            else:
+                validator_path.unlink(missing_ok=True)
+
+        total_size = offset + int(response.headers.get('content-length', 0))
         logger.info(f"  Size: {total_size / 1024 / 1024:.1f} MB")
 
-        with open(filepath, 'wb') as f:
-            downloaded = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    # Progress update every 1MB
-                    if downloaded % (1024 * 1024) < 8192:
-                        pct = (downloaded / total_size * 100) if total_size else 0
-                        logger.info(f"  Progress: {pct:.0f}%")
-
-        logger.info(f"  ✓ Saved: {filepath.name}")
+        # Copy the body in 1 MiB blocks without a per-chunk Python loop
+        response.raw.decode_content = True
+        with response, open(part_path, mode, buffering=DOWNLOAD_CHUNK_SIZE) as f:
+            shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+
+        # Atomic: filepath either doesn't exist or is the complete PDF
+        os.replace(part_path, filepath)
+        validator_path.unlink(missing_ok=True)
+        logger.info(f"  ✓ Saved: {filepath.name} ({filepath.stat().st_size / 1024 / 1024:.1f} MB)")
         return True
 
     except Exception as e:
@@ -101,6 +177,7 @@ def download_all_cfr_pdfs():
     year = "2024"  # Most recent complete edition
     downloaded = []
     failed = []
+    tasks = []
 
     for title_key, title_info in CFR_PDFS.items():
         title_num = title_key.replace("title", "")
@@ -118,13 +195,25 @@ def download_all_cfr_pdfs():
 
             logger.info(f"\n{vol_desc}")
 
+            part_path, validator_path = _part_paths(filepath)
             if filepath.exists():
                 size_mb = filepath.stat().st_size / 1024 / 1024
                 logger.info(f"  Already exists: {filepath.name} ({size_mb:.1f} MB)")
                 downloaded.append(str(filepath))
+                # Leftover partial from an older run is no longer needed
+                part_path.unlink(missing_ok=True)
+                validator_path.unlink(missing_ok=True)
                 continue
 
-            if download_pdf(url, filepath):
+            if part_path.exists():
+                logger.info(f"  Found partial download, will resume: {part_path.name}")
+            tasks.append((url, filepath))
+
+    # Download missing volumes in parallel (same host, so keep concurrency modest)
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_DOWNLOADS) as executor:
+        results = executor.map(lambda task: download_pdf(*task), tasks)
+        for (url, filepath), ok in zip(tasks, results):
+            if ok:
                 downloaded.append(str(filepath))
             else:
                 failed.append(url)
@@ -15,11 +15,17 @@ Title 30 Structure:
 import os
 import re
 import time
+import gzip
 import json
+import shutil
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lxml import etree
 from config import (
     ECFR_SOURCES,
     DOWNLOADS_DIR,
@@ -43,18 +49,49 @@ logger = logging.getLogger("ecfr_downloader")
 ECFR_DIR = DOWNLOADS_DIR / "ecfr"
 ECFR_DIR.mkdir(exist_ok=True)
 
+# Parts fetched concurrently from the eCFR API
+MAX_CONCURRENT_PARTS = 5
+
+# Copy buffer for streaming XML responses to disk
+STREAM_CHUNK_SIZE = 1 << 20
+
+# eCFR elements whose HEAD/P/AUTH children make up the regulation text
+SECTION_TAGS = frozenset(("DIV5", "DIV6", "DIV8", "SECTION", "P"))
+
 
 class ECFRDownloader:
     """Downloads federal regulations from eCFR API."""
 
-    def __init__(self):
+    def __init__(self, date: str = None, force: bool = False):
+        # One snapshot date for the whole run, so every part comes from the
+        # same eCFR version even if the run crosses midnight
+        self.date = date or datetime.now().strftime("%Y-%m-%d")
+        # Timestamp stamped into every text file header of this run
+        self.now_iso = datetime.now().isoformat()
+        # Re-fetch parts even when their files are already on disk
+        self.force = force
         self.session = requests.Session()
         self.session.headers.update({
             "User-Agent": REQUEST_CONFIG["user_agent"],
             "Accept": "application/json",
+            # eCFR XML compresses ~10x; keep compressed transfer explicit
+            "Accept-Encoding": "gzip, deflate",
         })
+        # Retry transient failures (429/5xx, dropped connections) with exponential backoff
+        self.session.mount("https://", HTTPAdapter(
+            pool_maxsize=MAX_CONCURRENT_PARTS,
+            max_retries=Retry(
+                total=REQUEST_CONFIG["retry_attempts"],
+                backoff_factor=1.0,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+            ),
+        ))
         self.api_base = ECFR_SOURCES["api_base"]
-        self.metadata = []
+        # One JSON line per saved part, flushed as it is written, so a
+        # crash or kill never loses the parts already downloaded
+        self.metadata_fp = open(ECFR_DIR / "metadata.jsonl", "a", encoding="utf-8", buffering=1)
+        self.downloaded_count = 0
 
     def _fetch_json(self, url: str) -> dict:
         """Fetch JSON from API endpoint."""
@@ -66,28 +103,40 @@ class ECFRDownloader:
             logger.error(f"API request failed: {url} - {e}")
             return None
 
-    def _fetch_xml(self, url: str) -> str:
-        """Fetch XML content from API."""
+    def _fetch_xml(self, url: str, dest_path: Path) -> bool:
+        """
+        Stream XML content from API straight to dest_path, gzip-compressed.
+        The body goes to a .part file first, so dest_path only ever exists
+        complete.
+        """
+        part_path = dest_path.with_suffix(dest_path.suffix + ".part")
         try:
             headers = {"Accept": "application/xml"}
-            response = self.session.get(url, timeout=REQUEST_CONFIG["timeout"], headers=headers)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
+            with self.session.get(url, timeout=REQUEST_CONFIG["timeout"], headers=headers, stream=True) as response:
+                response.raise_for_status()
+                logger.debug(f"Content-Encoding for {url}: {response.headers.get('Content-Encoding')}")
+                # Let urllib3 gunzip transparently while copying
+                response.raw.decode_content = True
+                # Level 3 keeps compression cheap; eCFR XML still shrinks ~8x
+                with gzip.open(part_path, "wb", compresslevel=3) as f:
+                    shutil.copyfileobj(response.raw, f, length=STREAM_CHUNK_SIZE)
+            os.replace(part_path, dest_path)
+            return True
+        except (requests.RequestException, OSError) as e:
             logger.error(f"XML request failed: {url} - {e}")
-            return None
+            part_path.unlink(missing_ok=True)
+            return False
 
     def get_title_structure(self, title: int) -> dict:
         """Get the structure of a CFR title (chapters, parts, sections)."""
-        url = f"{self.api_base}/structure/{datetime.now().strftime('%Y-%m-%d')}/title-{title}.json"
+        url = f"{self.api_base}/structure/{self.date}/title-{title}.json"
         logger.info(f"Fetching Title {title} structure...")
         return self._fetch_json(url)
 
-    def get_part_content(self, title: int, part: int) -> str:
-        """Get the full text content of a CFR part."""
-        date = datetime.now().strftime("%Y-%m-%d")
-        url = f"{self.api_base}/full/{date}/title-{title}/part-{part}.xml"
-        return self._fetch_xml(url)
+    def get_part_content(self, title: int, part: int, dest_path: Path) -> bool:
+        """Download the full XML content of a CFR part to dest_path (gzipped)."""
+        url = f"{self.api_base}/full/{self.date}/title-{title}/part-{part}.xml"
+        return self._fetch_xml(url, dest_path)
 
     def download_title_30(self):
         """Download Title 30 - Mineral Resources (primary mining regulations)."""
@@ -142,42 +191,7 @@ class ECFRDownloader:
             (104, "Pattern of Violations"),
         ]
 
-        for part_num, part_name in key_mining_parts:
-            logger.info(f"Downloading Part {part_num}: {part_name}")
-
-            part_dir = title_dir / f"part_{part_num}"
-            part_dir.mkdir(exist_ok=True)
-
-            # Get XML content
-            xml_content = self.get_part_content(30, part_num)
-            if xml_content:
-                # Save XML
-                xml_file = part_dir / f"part_{part_num}.xml"
-                with open(xml_file, "w", encoding="utf-8") as f:
-                    f.write(xml_content)
-
-                # Convert to plain text for easier processing
-                text_content = self._xml_to_text(xml_content)
-                text_file = part_dir / f"part_{part_num}.txt"
-                with open(text_file, "w", encoding="utf-8") as f:
-                    f.write(f"30 CFR Part {part_num}: {part_name}\n")
-                    f.write(f"Source: eCFR (Electronic Code of Federal Regulations)\n")
-                    f.write(f"Downloaded: {datetime.now().isoformat()}\n")
-                    f.write("=" * 60 + "\n\n")
-                    f.write(text_content)
-
-                self.metadata.append({
-                    "title": 30,
-                    "part": part_num,
-                    "name": part_name,
-                    "xml_file": str(xml_file),
-                    "text_file": str(text_file),
-                    "downloaded_at": datetime.now().isoformat(),
-                })
-
-                logger.info(f"  Saved Part {part_num} ({len(text_content)} chars)")
-
-            time.sleep(REQUEST_CONFIG["rate_limit_delay"])
+        self._download_parts(30, key_mining_parts, "eCFR (Electronic Code of Federal Regulations)")
 
     def download_title_29_osha(self):
         """Download relevant OSHA regulations from Title 29."""
@@ -185,94 +199,166 @@ class ECFRDownloader:
         logger.info("Downloading Title 29 - Labor (OSHA)")
         logger.info("=" * 60)
 
-        title_dir = ECFR_DIR / "title_29"
-        title_dir.mkdir(exist_ok=True)
-
         # Key OSHA parts relevant to mining
         osha_parts = [
             (1910, "Occupational Safety and Health Standards"),
             (1926, "Safety and Health Regulations for Construction"),
         ]
 
-        for part_num, part_name in osha_parts:
-            logger.info(f"Downloading Part {part_num}: {part_name}")
-
-            part_dir = title_dir / f"part_{part_num}"
-            part_dir.mkdir(exist_ok=True)
-
-            xml_content = self.get_part_content(29, part_num)
-            if xml_content:
-                xml_file = part_dir / f"part_{part_num}.xml"
-                with open(xml_file, "w", encoding="utf-8") as f:
-                    f.write(xml_content)
-
-                text_content = self._xml_to_text(xml_content)
-                text_file = part_dir / f"part_{part_num}.txt"
-                with open(text_file, "w", encoding="utf-8") as f:
-                    f.write(f"29 CFR Part {part_num}: {part_name}\n")
-                    f.write(f"Source: eCFR (OSHA Regulations)\n")
-                    f.write(f"Downloaded: {datetime.now().isoformat()}\n")
-                    f.write("=" * 60 + "\n\n")
-                    f.write(text_content)
-
-                self.metadata.append({
-                    "title": 29,
-                    "part": part_num,
-                    "name": part_name,
-                    "xml_file": str(xml_file),
-                    "text_file": str(text_file),
-                    "downloaded_at": datetime.now().isoformat(),
-                })
-
-                logger.info(f"  Saved Part {part_num} ({len(text_content)} chars)")
-
+        self._download_parts(29, osha_parts, "eCFR (OSHA Regulations)")
+
+    def _download_parts(self, title: int, parts: list, source_label: str):
+        """
+        Download parts of a CFR title into downloads/ecfr/title_<title>/part_<n>/.
+
+        Args:
+            title: CFR title number
+            parts: (part number, part name) pairs
+            source_label: Source line written into each text file header
+        """
+        title_dir = ECFR_DIR / f"title_{title}"
+
+        # Create every part directory up front so workers only write files
+        pending = []
+        for part_num, part_name in parts:
+            if not self.force and self._part_is_saved(title_dir, part_num):
+                logger.info(f"Skipping Part {part_num}: already downloaded (use --force to re-fetch)")
+                continue
+            (title_dir / f"part_{part_num}").mkdir(parents=True, exist_ok=True)
+            pending.append((part_num, part_name))
+
+        # Fetch up to MAX_CONCURRENT_PARTS parts at once over the shared session.
+        # Metadata is recorded from this thread as parts finish (single writer).
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PARTS) as pool:
+            futures = [
+                pool.submit(self._fetch_and_save_part, title, part_num, part_name, title_dir, source_label)
+                for part_num, part_name in pending
+            ]
+            for future in as_completed(futures):
+                entry = future.result()
+                if entry:
+                    self._record_metadata(entry)
+
+    def _fetch_and_save_part(self, title: int, part_num: int, part_name: str,
+                             title_dir: Path, source_label: str) -> dict:
+        """Fetch one CFR part and save it as XML and plain text. Returns its metadata entry."""
+        logger.info(f"Downloading Part {part_num}: {part_name}")
+
+        part_dir = title_dir / f"part_{part_num}"
+
+        # Stream XML content to disk (reuse a previous run's download unless forced)
+        xml_file = part_dir / f"part_{part_num}.xml.gz"
+        if not self.force and xml_file.exists() and xml_file.stat().st_size > 0:
+            logger.info(f"  Using existing XML for Part {part_num}")
+        else:
+            fetched = self.get_part_content(title, part_num, xml_file)
+            # Hold the worker briefly so the pool size also bounds the request rate
             time.sleep(REQUEST_CONFIG["rate_limit_delay"])
-
-    def _xml_to_text(self, xml_content: str) -> str:
-        """Convert XML regulation content to readable text."""
-        from bs4 import BeautifulSoup
-
-        soup = BeautifulSoup(xml_content, "xml")
-
-        # Extract structured text
-        lines = []
-
-        # Get all sections
-        for section in soup.find_all(["DIV5", "DIV6", "DIV8", "SECTION", "P"]):
-            # Get section number and heading
-            head = section.find("HEAD")
-            if head:
-                lines.append("\n" + "=" * 40)
-                lines.append(head.get_text(strip=True))
-                lines.append("=" * 40)
-
-            # Get paragraph content
-            for p in section.find_all("P", recursive=False):
-                text = p.get_text(separator=" ", strip=True)
-                if text:
-                    lines.append(text)
-
-            # Get auth/source notes
-            auth = section.find("AUTH")
-            if auth:
-                lines.append(f"\n[Authority: {auth.get_text(strip=True)}]")
-
-        if not lines:
+            if not fetched:
+                return None
+
+        # Convert to plain text for easier processing, streamed into the file
+        text_file = part_dir / f"part_{part_num}.txt"
+        with open(text_file, "w", encoding="utf-8", buffering=STREAM_CHUNK_SIZE) as f:
+            f.write(
+                f"{title} CFR Part {part_num}: {part_name}\n"
+                f"Source: {source_label}\n"
+                f"Downloaded: {self.now_iso}\n"
+                f"{'=' * 60}\n\n"
+            )
+            text_chars = self._xml_to_text(xml_file, f)
+
+        logger.info(f"  Saved Part {part_num} ({text_chars} chars)")
+
+        return {
+            "title": title,
+            "part": part_num,
+            "name": part_name,
+            "xml_file": str(xml_file),
+            "text_file": str(text_file),
+            "downloaded_at": datetime.now().isoformat(),
+        }
+
+    @staticmethod
+    def _part_is_saved(title_dir: Path, part_num: int) -> bool:
+        """Whether both the XML and text files of a part are already on disk."""
+        part_dir = title_dir / f"part_{part_num}"
+        return all(
+            path.exists() and path.stat().st_size > 0
+            for path in (part_dir / f"part_{part_num}.xml.gz", part_dir / f"part_{part_num}.txt")
+        )
+
+    def _xml_to_text(self, xml_path: Path, out_fp) -> int:
+        """
+        Convert a gzipped XML regulation file to readable text, writing it to out_fp
+        fragment by fragment. Returns the number of characters written.
+
+        Walks the file once with iterparse, keeping a stack of open tags so
+        each HEAD/P/AUTH can be attributed to its enclosing section as it
+        closes; finished subtrees are cleared to keep memory flat.
+        """
+        # Extract structured text, separating fragments with blank lines
+        written = 0
+
+        def emit(fragment):
+            nonlocal written
+            if written:
+                out_fp.write("\n\n")
+                written += 2
+            out_fp.write(fragment)
+            written += len(fragment)
+
+        open_tags = []
+        p_depth = 0  # Nested P text is still needed by the enclosing P
+        with gzip.open(xml_path, "rb") as xml_fp:
+            for event, elem in etree.iterparse(xml_fp, events=("start", "end")):
+                if event == "start":
+                    open_tags.append(elem.tag)
+                    if elem.tag == "P":
+                        p_depth += 1
+                    continue
+
+                open_tags.pop()
+                if elem.tag == "P":
+                    p_depth -= 1
+                if not open_tags or open_tags[-1] not in SECTION_TAGS:
+                    continue
+
+                if elem.tag == "HEAD":
+                    # Section number and heading
+                    emit("\n" + "=" * 40)
+                    emit("".join(s.strip() for s in elem.itertext()))
+                    emit("=" * 40)
+                elif elem.tag == "P":
+                    # Paragraph content
+                    text = " ".join(s.strip() for s in elem.itertext() if s.strip())
+                    if text:
+                        emit(text)
+                elif elem.tag == "AUTH":
+                    # Auth/source notes
+                    emit(f"\n[Authority: {''.join(s.strip() for s in elem.itertext())}]")
+
+                if not p_depth:
+                    elem.clear()
+
+        if not written:
             # Fallback: just get all text
-            text = soup.get_text(separator="\n", strip=True)
-            return text
+            with gzip.open(xml_path, "rb") as xml_fp:
+                root = etree.parse(xml_fp).getroot()
+            text = "\n".join(s.strip() for s in root.itertext() if s.strip())
+            out_fp.write(text)
+            written = len(text)
 
-        return "\n\n".join(lines)
+        return written
 
-    def _save_metadata(self):
-        """Save metadata about downloaded regulations."""
-        metadata_file = ECFR_DIR / "metadata.json"
-        with open(metadata_file, "w") as f:
-            json.dump(self.metadata, f, indent=2)
+    def _record_metadata(self, entry: dict):
+        """Append metadata about a downloaded regulation to metadata.jsonl."""
+        self.metadata_fp.write(json.dumps(entry) + "\n")
+        self.downloaded_count += 1
 
     def run(self):
         """Run all downloads."""
-        logger.info("Starting eCFR download")
+        logger.info(f"Starting eCFR download (snapshot {self.date})")
         start_time = datetime.now()
 
         try:
@@ -284,16 +370,31 @@ class ECFRDownloader:
         except Exception as e:
             logger.error(f"Download error: {e}", exc_info=True)
         finally:
-            self._save_metadata()
+            self.metadata_fp.close()
 
             elapsed = datetime.now() - start_time
             logger.info("=" * 60)
             logger.info("eCFR Download Complete")
-            logger.info(f"Total regulations downloaded: {len(self.metadata)}")
+            logger.info(f"Total regulations downloaded: {self.downloaded_count}")
             logger.info(f"Time elapsed: {elapsed}")
             logger.info("=" * 60)
 
 
 if __name__ == "__main__":
-    downloader = ECFRDownloader()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download CFR regulations from the eCFR API")
+    parser.add_argument(
+        "--date",
+        default=None,
+        help="eCFR snapshot date (YYYY-MM-DD); defaults to today"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-download parts that already exist locally"
+    )
+    args = parser.parse_args()
+
+    downloader = ECFRDownloader(date=args.date, force=args.force)
     downloader.run()
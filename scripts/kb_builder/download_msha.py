@@ -13,13 +13,22 @@ import os
 import re
 import time
 import json
+import random
+import shutil
 import logging
 import hashlib
+import threading
+import statistics
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from pathlib import Path
 from datetime import datetime
+from collections import deque
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html as lxml_html
 from config import (
     MSHA_SOURCES,
     DOWNLOADS_DIR,
@@ -28,6 +37,13 @@ from config import (
     LOGGING_CONFIG,
 )
 
+# orjson is optional: a faster encoder for the (large) metadata file
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Setup logging
 logging.basicConfig(
     level=getattr(logging, LOGGING_CONFIG["level"]),
@@ -43,6 +59,110 @@ logger = logging.getLogger("msha_downloader")
 MSHA_DIR = DOWNLOADS_DIR / "msha"
 MSHA_DIR.mkdir(exist_ok=True)
 
+# Document downloads in flight at once (all against the same few hosts)
+MAX_CONCURRENT_DOWNLOADS = 8
+
+# Bytes copied per read when streaming a document to disk
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Save metadata after this many new downloads, so a crash or kill mid-run
+# keeps the records of files already on disk
+CHECKPOINT_EVERY = 50
+
+# Build only the anchors of a page when extracting links
+ANCHOR_STRAINER = SoupStrainer("a", href=True)
+
+# Elements dropped from a page before extracting its text
+_DROP_TAGS = ("script", "style", "nav", "footer", "header", etree.Comment)
+
+# Link filters and filename cleanup, compiled once
+_RE_PDF = re.compile(r"\.pdf$", re.IGNORECASE)
+_RE_DOC = re.compile(r"\.(pdf|doc|docx)$", re.IGNORECASE)
+_RE_TRAIN = re.compile(r"\.(pdf|doc|docx|ppt|pptx)$", re.IGNORECASE)
+_RE_SAFE_STRIP = re.compile(r"[^\w\s-]")
+_RE_WS = re.compile(r"\s+")
+
+# Substrings marking a direct document link (".doc" also covers ".docx")
+_DOC_EXTS = (".pdf", ".doc")
+
+# File extension by Content-Type substring, first match wins
+_CT_EXT = (
+    ("pdf", ".pdf"),
+    ("msword", ".docx"),
+    ("wordprocessingml", ".docx"),
+    ("html", ".html"),
+)
+
+# Upper bound (seconds) on a single retry backoff
+MAX_RETRY_BACKOFF = 30
+
+# Adaptive (AIMD) concurrency: start at AIMD_MIN_CONCURRENCY fetches in
+# flight, add AIMD_ALPHA after each AIMD_WINDOW successes whose median
+# response time is within AIMD_TARGET_LATENCY seconds, and scale by
+# AIMD_BETA on throttling, server errors or timeouts.
+# MAX_CONCURRENT_DOWNLOADS is the ceiling.
+AIMD_MIN_CONCURRENCY = 2
+AIMD_ALPHA = 1
+AIMD_BETA = 0.5
+AIMD_TARGET_LATENCY = 2.0
+AIMD_WINDOW = 20
+
+
+class JitteredRetry(Retry):
+    """
+    Retry with full-jitter exponential backoff: each wait is drawn uniformly
+    from [0, backoff], so workers that failed together do not retry together.
+    A Retry-After header from the server still takes precedence.
+    """
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, min(MAX_RETRY_BACKOFF, super().get_backoff_time()))
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit that adapts like TCP congestion control: additive
+    increase while responses stay fast, multiplicative decrease when the
+    server pushes back. Use as a context manager around each request.
+    """
+
+    def __init__(self, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(minimum)
+        self._active = 0
+        self._latencies = deque(maxlen=AIMD_WINDOW)
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float):
+        """Record a successful request's response time."""
+        with self._cond:
+            self._latencies.append(latency)
+            if (len(self._latencies) == AIMD_WINDOW
+                    and statistics.median(self._latencies) <= AIMD_TARGET_LATENCY):
+                self.limit = min(self.maximum, self.limit + AIMD_ALPHA)
+                self._latencies.clear()
+                self._cond.notify_all()
+
+    def on_congestion(self):
+        """Back off after a 429, 5xx or timeout."""
+        with self._cond:
+            self.limit = max(self.minimum, self.limit * AIMD_BETA)
+            self._latencies.clear()
+            logger.info(f"Server pushing back, concurrency limit now {int(self.limit)}")
+
 
 class MSHADownloader:
     """Downloads content from MSHA website."""
@@ -50,71 +170,135 @@ class MSHADownloader:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": REQUEST_CONFIG["user_agent"]})
+        # Keep one pooled connection per worker and retry transient failures
+        # (429/5xx, dropped connections) with jittered exponential backoff;
+        # other 4xx responses fail straight away
+        adapter = HTTPAdapter(
+            pool_maxsize=MAX_CONCURRENT_DOWNLOADS,
+            max_retries=JitteredRetry(
+                total=REQUEST_CONFIG["retry_attempts"],
+                backoff_factor=REQUEST_CONFIG["retry_delay"],
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = AIMDLimiter(AIMD_MIN_CONCURRENCY, MAX_CONCURRENT_DOWNLOADS)
         self.downloaded_urls = set()
         self.metadata = []
+        # Guards downloaded_urls/metadata/history updates and checkpoints across workers
+        self._state_lock = threading.Lock()
+        self._since_checkpoint = 0
         self.base_url = MSHA_SOURCES["base_url"]
 
-        # Load previously downloaded URLs
-        self.history_file = MSHA_DIR / "download_history.json"
+        # Load previously downloaded URLs. The history is an append-only log
+        # (one JSON line per URL, flushed as written), so recording a download
+        # never rewrites the whole file
+        self.history_file = MSHA_DIR / "download_history.jsonl"
         self._load_history()
+        self.history_fp = open(self.history_file, "a", encoding="utf-8", buffering=1)
 
     def _load_history(self):
         """Load download history to avoid re-downloading."""
+        # Fold in the single-document history written by older versions
+        legacy_file = MSHA_DIR / "download_history.json"
+        if legacy_file.exists():
+            try:
+                with open(legacy_file, "r") as f:
+                    legacy_urls = json.load(f).get("urls", [])
+                with open(self.history_file, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps({"url": url}) + "\n" for url in legacy_urls)
+                legacy_file.unlink()
+            except Exception as e:
+                logger.warning(f"Could not migrate legacy history: {e}")
+
         if self.history_file.exists():
             try:
-                with open(self.history_file, "r") as f:
-                    data = json.load(f)
-                    self.downloaded_urls = set(data.get("urls", []))
-                    logger.info(f"Loaded {len(self.downloaded_urls)} previously downloaded URLs")
+                with open(self.history_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            self.downloaded_urls.add(json.loads(line)["url"])
+                        except (ValueError, KeyError):
+                            continue  # torn last line from an interrupted run
+                logger.info(f"Loaded {len(self.downloaded_urls)} previously downloaded URLs")
             except Exception as e:
                 logger.warning(f"Could not load history: {e}")
 
-    def _save_history(self):
-        """Save download history."""
-        with open(self.history_file, "w") as f:
-            json.dump({"urls": list(self.downloaded_urls)}, f)
+    @staticmethod
+    def _write_json_atomic(path: Path, data, indent: bool = False):
+        """Write JSON to a temp file and swap it in, so path is never left torn."""
+        if ORJSON_AVAILABLE:
+            payload = orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 if indent else 0)
+        else:
+            payload = json.dumps(data, indent=2 if indent else None, default=str).encode("utf-8")
+
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_bytes(payload)
+        os.replace(tmp_path, path)
 
     def _save_metadata(self):
         """Save metadata about downloaded files."""
-        metadata_file = MSHA_DIR / "metadata.json"
-        with open(metadata_file, "w") as f:
-            json.dump(self.metadata, f, indent=2, default=str)
+        self._write_json_atomic(MSHA_DIR / "metadata.json", self.metadata, indent=True)
+
+    def _record_download(self, url: str, metadata: dict):
+        """Remember a finished download, checkpointing metadata every CHECKPOINT_EVERY files."""
+        with self._state_lock:
+            self.downloaded_urls.add(url)
+            self.history_fp.write(json.dumps({"url": url}) + "\n")
+            self.metadata.append(metadata)
+            self._since_checkpoint += 1
+            if self._since_checkpoint >= CHECKPOINT_EVERY:
+                self._since_checkpoint = 0
+                self._save_metadata()
 
     def _get_safe_filename(self, url: str, title: str = None) -> str:
         """Generate a safe filename from URL or title."""
         if title:
             # Clean title for filename
-            safe_name = re.sub(r'[^\w\s-]', '', title)
-            safe_name = re.sub(r'\s+', '_', safe_name)[:100]
+            safe_name = _RE_SAFE_STRIP.sub('', title)
+            safe_name = _RE_WS.sub('_', safe_name)[:100]
         else:
             # Use URL path
             parsed = urlparse(url)
             safe_name = parsed.path.replace("/", "_").strip("_")
 
-        # Add hash for uniqueness
-        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
+        # Add hash for uniqueness (md5 kept so names match earlier runs;
+        # not a security use, which also keeps it working on FIPS builds)
+        url_hash = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()[:8]
         return f"{safe_name}_{url_hash}"
 
-    def _fetch_page(self, url: str, retries: int = None) -> requests.Response:
-        """Fetch a page with retry logic."""
-        retries = retries or REQUEST_CONFIG["retry_attempts"]
-
-        for attempt in range(retries):
+    def _fetch_page(self, url: str, stream: bool = False) -> requests.Response:
+        """
+        Fetch a page (the session adapter retries transient failures).
+        With stream=True the body is left unread for the caller to consume.
+        """
+        with self.limiter:
             try:
                 response = self.session.get(
                     url,
                     timeout=REQUEST_CONFIG["timeout"],
                     allow_redirects=True,
+                    stream=stream,
                 )
                 response.raise_for_status()
-                return response
             except requests.RequestException as e:
-                logger.warning(f"Attempt {attempt + 1}/{retries} failed for {url}: {e}")
-                if attempt < retries - 1:
-                    time.sleep(REQUEST_CONFIG["retry_delay"])
-
-        logger.error(f"Failed to fetch {url} after {retries} attempts")
-        return None
+                if self._is_congestion(e):
+                    self.limiter.on_congestion()
+                logger.error(f"Failed to fetch {url}: {e}")
+                return None
+
+            # Time to response headers, so large bodies do not count as slowness
+            self.limiter.on_success(response.elapsed.total_seconds())
+            return response
+
+    @staticmethod
+    def _is_congestion(error: requests.RequestException) -> bool:
+        """Whether a failed request means the server is overloaded or throttling."""
+        if isinstance(error, (requests.exceptions.RetryError, requests.Timeout, requests.ConnectionError)):
+            return True
+        response = getattr(error, "response", None)
+        return response is not None and (response.status_code == 429 or response.status_code >= 500)
 
     def _download_file(self, url: str, subdir: str = "") -> dict:
         """Download a file (PDF, DOC, etc.) and return metadata."""
@@ -122,57 +306,69 @@ class MSHADownloader:
             logger.debug(f"Skipping already downloaded: {url}")
             return None
 
-        response = self._fetch_page(url)
+        response = self._fetch_page(url, stream=True)
         if not response:
             return None
 
-        # Determine file extension
-        content_type = response.headers.get("Content-Type", "")
-        if "pdf" in content_type:
-            ext = ".pdf"
-        elif "msword" in content_type or "wordprocessingml" in content_type:
-            ext = ".docx"
-        elif "html" in content_type:
-            ext = ".html"
-        else:
-            # Try to get from URL
-            parsed = urlparse(url)
-            ext = Path(parsed.path).suffix or ".bin"
+        with response:
+            # Determine file extension, falling back to the URL's
+            content_type = response.headers.get("Content-Type", "")
+            ext = next((ext for key, ext in _CT_EXT if key in content_type), None)
+            if ext is None:
+                ext = Path(urlparse(url).path).suffix or ".bin"
 
-        # Create subdirectory
-        save_dir = MSHA_DIR / subdir if subdir else MSHA_DIR
-        save_dir.mkdir(parents=True, exist_ok=True)
+            # Create subdirectory
+            save_dir = MSHA_DIR / subdir if subdir else MSHA_DIR
+            save_dir.mkdir(parents=True, exist_ok=True)
 
-        # Generate filename
-        filename = self._get_safe_filename(url) + ext
-        filepath = save_dir / filename
+            # Generate filename
+            filename = self._get_safe_filename(url) + ext
+            filepath = save_dir / filename
 
-        # Save file
-        with open(filepath, "wb") as f:
-            f.write(response.content)
+            # Save file, copying the body from the socket in chunks rather
+            # than holding the whole document in memory
+            try:
+                response.raw.decode_content = True
+                with open(filepath, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+            except Exception as e:
+                logger.error(f"Failed to save {url}: {e}")
+                filepath.unlink(missing_ok=True)
+                return None
 
-        self.downloaded_urls.add(url)
-        logger.info(f"Downloaded: {filepath.name} ({len(response.content)} bytes)")
+        size_bytes = filepath.stat().st_size
+        logger.info(f"Downloaded: {filepath.name} ({size_bytes} bytes)")
 
         metadata = {
             "url": url,
             "filepath": str(filepath),
             "filename": filename,
-            "size_bytes": len(response.content),
+            "size_bytes": size_bytes,
             "content_type": content_type,
             "downloaded_at": datetime.now().isoformat(),
             "category": subdir or "general",
         }
-        self.metadata.append(metadata)
+        self._record_download(url, metadata)
 
         # Rate limiting
         time.sleep(REQUEST_CONFIG["rate_limit_delay"])
 
         return metadata
 
-    def _extract_links(self, html: str, base_url: str, pattern: str = None) -> list:
+    def _download_files(self, urls, subdir: str = "") -> list:
+        """Download several files at once, at most MAX_CONCURRENT_DOWNLOADS in flight."""
+        # Dedupe up front so two workers never fetch the same URL
+        pending = list(dict.fromkeys(url for url in urls if url not in self.downloaded_urls))
+        if not pending:
+            return []
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS) as pool:
+            results = pool.map(lambda url: self._download_file(url, subdir), pending)
+            return [metadata for metadata in results if metadata]
+
+    def _extract_links(self, html: str, base_url: str, pattern: re.Pattern = None) -> list:
         """Extract links from HTML content."""
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, "lxml", parse_only=ANCHOR_STRAINER)
         links = []
 
         for a in soup.find_all("a", href=True):
@@ -180,17 +376,20 @@ class MSHADownloader:
             full_url = urljoin(base_url, href)
 
             # Filter by pattern if provided
-            if pattern and not re.search(pattern, full_url, re.IGNORECASE):
+            if pattern and not pattern.search(full_url):
                 continue
 
             # Only include MSHA domain links or direct file downloads
-            if self.base_url in full_url or any(
-                ext in full_url.lower() for ext in [".pdf", ".doc", ".docx"]
-            ):
+            if self.base_url in full_url or self._is_document_url(full_url.lower()):
                 links.append({"url": full_url, "text": a.get_text(strip=True)})
 
         return links
 
+    @staticmethod
+    def _is_document_url(url_lower: str) -> bool:
+        """Whether a lowercased URL points at a document file."""
+        return any(ext in url_lower for ext in _DOC_EXTS)
+
     def download_regulations(self):
         """Download 30 CFR mining regulations."""
         logger.info("=" * 50)
@@ -209,11 +408,10 @@ class MSHADownloader:
             self._save_html_content(response.text, url, "regulations")
 
             # Find PDF links
-            links = self._extract_links(response.text, url, r"\.(pdf|doc|docx)$")
+            links = self._extract_links(response.text, url, _RE_DOC)
             logger.info(f"Found {len(links)} document links")
 
-            for link in links:
-                self._download_file(link["url"], "regulations")
+            self._download_files((link["url"] for link in links), "regulations")
 
     def download_pibs_and_pils(self):
         """Download Policy Information Bulletins and Procedure Instruction Letters."""
@@ -242,16 +440,19 @@ class MSHADownloader:
             # Find all document links
             links = self._extract_links(response.text, url)
 
+            doc_urls = []
             for link in links:
-                if any(ext in link["url"].lower() for ext in [".pdf", ".doc"]):
-                    self._download_file(link["url"], "guidance")
-                elif "/pib/" in link["url"].lower() or "/pil/" in link["url"].lower():
+                url_lower = link["url"].lower()
+                if self._is_document_url(url_lower):
+                    doc_urls.append(link["url"])
+                elif "/pib/" in url_lower or "/pil/" in url_lower:
                     # Follow link to get the actual document
                     sub_response = self._fetch_page(link["url"])
                     if sub_response:
-                        sub_links = self._extract_links(sub_response.text, link["url"], r"\.pdf$")
-                        for sub_link in sub_links:
-                            self._download_file(sub_link["url"], "guidance")
+                        sub_links = self._extract_links(sub_response.text, link["url"], _RE_PDF)
+                        doc_urls.extend(sub_link["url"] for sub_link in sub_links)
+
+            self._download_files(doc_urls, "guidance")
 
     def download_training_materials(self):
         """Download training materials and educational content."""
@@ -270,11 +471,10 @@ class MSHADownloader:
             self._save_html_content(response.text, url, "training")
 
             # Get all PDF/document links
-            links = self._extract_links(response.text, url, r"\.(pdf|doc|docx|ppt|pptx)$")
+            links = self._extract_links(response.text, url, _RE_TRAIN)
             logger.info(f"Found {len(links)} training documents")
 
-            for link in links:
-                self._download_file(link["url"], "training")
+            self._download_files((link["url"] for link in links), "training")
 
     def download_fatality_reports(self):
         """Download fatality reports - critical safety information."""
@@ -290,11 +490,10 @@ class MSHADownloader:
             self._save_html_content(response.text, url, "fatality_reports")
 
             # These are typically PDFs with detailed incident analysis
-            links = self._extract_links(response.text, url, r"\.pdf$")
+            links = self._extract_links(response.text, url, _RE_PDF)
             logger.info(f"Found {len(links)} fatality report PDFs")
 
-            for link in links:
-                self._download_file(link["url"], "fatality_reports")
+            self._download_files((link["url"] for link in links), "fatality_reports")
 
     def download_compliance_assistance(self):
         """Download compliance assistance materials."""
@@ -312,27 +511,32 @@ class MSHADownloader:
 
             self._save_html_content(response.text, url, "compliance")
 
-            links = self._extract_links(response.text, url, r"\.(pdf|doc|docx)$")
-            for link in links:
-                self._download_file(link["url"], "compliance")
+            links = self._extract_links(response.text, url, _RE_DOC)
+            self._download_files((link["url"] for link in links), "compliance")
 
     def _save_html_content(self, html: str, url: str, subdir: str):
         """Save HTML content with extracted text."""
         save_dir = MSHA_DIR / subdir
         save_dir.mkdir(parents=True, exist_ok=True)
 
-        soup = BeautifulSoup(html, "html.parser")
+        try:
+            doc = lxml_html.document_fromstring(html)
+        except (etree.ParserError, ValueError) as e:
+            logger.warning(f"Could not parse HTML from {url}: {e}")
+            return
 
-        # Remove script and style elements
-        for element in soup(["script", "style", "nav", "footer", "header"]):
-            element.decompose()
+        # Remove script/style elements, page chrome and comments in one C-level pass
+        etree.strip_elements(doc, *_DROP_TAGS, with_tail=False)
 
         # Get main content
-        main_content = soup.find("main") or soup.find("article") or soup.find("body")
-        if main_content:
-            text = main_content.get_text(separator="\n", strip=True)
-        else:
-            text = soup.get_text(separator="\n", strip=True)
+        main_content = doc.find(".//main")
+        if main_content is None:
+            main_content = doc.find(".//article")
+        if main_content is None:
+            main_content = doc.find(".//body")
+        if main_content is None:
+            main_content = doc
+        text = "\n".join(s.strip() for s in main_content.itertext() if s.strip())
 
         # Clean up text
         lines = [line.strip() for line in text.split("\n") if line.strip()]
@@ -377,8 +581,8 @@ class MSHADownloader:
         except Exception as e:
             logger.error(f"Download error: {e}")
         finally:
-            # Save progress
-            self._save_history()
+            # Save progress (history lines are already on disk)
+            self.history_fp.close()
             self._save_metadata()
 
             elapsed = datetime.now() - start_time
@@ -12,11 +12,16 @@ These datasets provide real-world mining safety statistics and patterns.
 """
 
 import os
-import io
+import json
+import shutil
 import zipfile
 import logging
 import requests
 import pandas as pd
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from pathlib import Path
 from datetime import datetime
 from config import (
@@ -27,6 +32,22 @@ from config import (
     LOGGING_CONFIG,
 )
 
+# PyArrow is optional: it streams the (very large) violations file in C
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# orjson is optional: a faster encoder for the metadata file
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Setup logging
 logging.basicConfig(
     level=getattr(logging, LOGGING_CONFIG["level"]),
@@ -42,6 +63,32 @@ logger = logging.getLogger("msha_data_downloader")
 DATA_DIR = DOWNLOADS_DIR / "msha_data"
 DATA_DIR.mkdir(exist_ok=True)
 
+# Bytes copied per read when streaming a dataset ZIP to disk
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Low-cardinality text columns, loaded as pandas categoricals
+CATEGORY_COLUMNS = {"MINE_TYPE", "STATE", "DEGREE_INJURY", "SECTION_OF_ACT"}
+
+
+def read_dataset_columns(path: Path, wanted: list, **kwargs):
+    """
+    Read only the wanted columns (those present in the file) of a
+    pipe-delimited MSHA dataset. Extra kwargs go to pd.read_csv.
+    """
+    header = pd.read_csv(path, sep="|", encoding="latin-1", nrows=0).columns
+    # Keep at least one column so the row count is still available
+    usecols = [col for col in wanted if col in header] or [header[0]]
+
+    return pd.read_csv(
+        path,
+        sep="|",
+        encoding="latin-1",
+        usecols=usecols,
+        dtype={col: "category" for col in usecols if col in CATEGORY_COLUMNS},
+        on_bad_lines="skip",
+        **kwargs,
+    )
+
 
 class MSHADataDownloader:
     """Downloads bulk datasets from MSHA Open Government Data."""
@@ -49,6 +96,15 @@ class MSHADataDownloader:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": REQUEST_CONFIG["user_agent"]})
+        # Retry transient failures (429/5xx, dropped connections) with exponential backoff
+        self.session.mount("https://", HTTPAdapter(
+            max_retries=Retry(
+                total=REQUEST_CONFIG["retry_attempts"],
+                backoff_factor=1.0,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+            ),
+        ))
         self.datasets = []
 
     def download_dataset(self, url: str, name: str) -> bool:
@@ -56,26 +112,29 @@ class MSHADataDownloader:
         logger.info(f"Downloading {name}...")
         logger.info(f"  URL: {url}")
 
+        zip_path = DATA_DIR / f"{name}.zip.part"
         try:
-            response = self.session.get(
+            with self.session.get(
                 url,
                 timeout=120,  # Longer timeout for large files
                 stream=True,
-            )
-            response.raise_for_status()
+            ) as response:
+                response.raise_for_status()
 
-            # Get file size
-            total_size = int(response.headers.get("content-length", 0))
-            logger.info(f"  Size: {total_size / 1024 / 1024:.1f} MB")
+                # Get file size
+                total_size = int(response.headers.get("content-length", 0))
+                logger.info(f"  Size: {total_size / 1024 / 1024:.1f} MB")
 
-            # Download to memory
-            content = response.content
+                # Stream to disk instead of holding the whole ZIP in memory
+                response.raw.decode_content = True
+                with open(zip_path, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
 
             # Extract ZIP
             dataset_dir = DATA_DIR / name
             dataset_dir.mkdir(exist_ok=True)
 
-            with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            with zipfile.ZipFile(zip_path) as zf:
                 zf.extractall(dataset_dir)
                 extracted_files = zf.namelist()
                 logger.info(f"  Extracted {len(extracted_files)} files")
@@ -93,6 +152,8 @@ class MSHADataDownloader:
         except Exception as e:
             logger.error(f"  Failed: {e}")
             return False
+        finally:
+            zip_path.unlink(missing_ok=True)
 
     def process_to_knowledge_base(self):
         """Convert datasets to text documents for the knowledge base."""
@@ -103,12 +164,18 @@ class MSHADataDownloader:
         kb_dir = DATA_DIR / "knowledge_base"
         kb_dir.mkdir(exist_ok=True)
 
-        # Process each dataset type
-        self._process_mines_data(kb_dir)
-        self._process_accidents_data(kb_dir)
-        self._process_violations_data(kb_dir)
-
-    def _process_mines_data(self, kb_dir: Path):
+        # Each dataset is an independent CPU-bound CSV parse, so run them in parallel
+        processors = (
+            self._process_mines_data,
+            self._process_accidents_data,
+            self._process_violations_data,
+        )
+        with ProcessPoolExecutor(max_workers=len(processors)) as executor:
+            for future in [executor.submit(process, kb_dir) for process in processors]:
+                future.result()
+
+    @staticmethod
+    def _process_mines_data(kb_dir: Path):
         """Create knowledge base entries from mines data."""
         mines_dir = DATA_DIR / "Mines"
         if not mines_dir.exists():
@@ -121,13 +188,7 @@ class MSHADataDownloader:
 
         try:
             # Read mines data
-            df = pd.read_csv(
-                txt_files[0],
-                sep="|",
-                encoding="latin-1",
-                low_memory=False,
-                on_bad_lines="skip",
-            )
+            df = read_dataset_columns(txt_files[0], ["MINE_TYPE", "STATE"])
 
             # Create summary document
             summary = []
@@ -162,7 +223,8 @@ class MSHADataDownloader:
         except Exception as e:
             logger.error(f"Error processing mines data: {e}")
 
-    def _process_accidents_data(self, kb_dir: Path):
+    @staticmethod
+    def _process_accidents_data(kb_dir: Path):
         """Create knowledge base entries from accidents data."""
         accidents_dir = DATA_DIR / "Accidents"
         if not accidents_dir.exists():
@@ -173,13 +235,7 @@ class MSHADataDownloader:
             return
 
         try:
-            df = pd.read_csv(
-                txt_files[0],
-                sep="|",
-                encoding="latin-1",
-                low_memory=False,
-                on_bad_lines="skip",
-            )
+            df = read_dataset_columns(txt_files[0], ["DEGREE_INJURY", "CAL_YR"])
 
             summary = []
             summary.append("# MSHA Accident Statistics")
@@ -189,12 +245,11 @@ class MSHADataDownloader:
             summary.append("")
 
             # Accident types
-            if "ACCIDENT_TYPE" in df.columns or "DEGREE_INJURY" in df.columns:
+            if "DEGREE_INJURY" in df.columns:
                 summary.append("## Injury Severity Distribution")
-                if "DEGREE_INJURY" in df.columns:
-                    injury_counts = df["DEGREE_INJURY"].value_counts()
-                    for injury_type, count in injury_counts.items():
-                        summary.append(f"- {injury_type}: {count:,}")
+                injury_counts = df["DEGREE_INJURY"].value_counts()
+                for injury_type, count in injury_counts.items():
+                    summary.append(f"- {injury_type}: {count:,}")
                 summary.append("")
 
             # By year
@@ -223,7 +278,8 @@ class MSHADataDownloader:
         except Exception as e:
             logger.error(f"Error processing accidents data: {e}")
 
-    def _process_violations_data(self, kb_dir: Path):
+    @staticmethod
+    def _process_violations_data(kb_dir: Path):
         """Create knowledge base entries from violations data."""
         violations_dir = DATA_DIR / "Violations"
         if not violations_dir.exists():
@@ -234,26 +290,7 @@ class MSHADataDownloader:
             return
 
         try:
-            # Violations file can be very large, read in chunks
-            chunks = pd.read_csv(
-                txt_files[0],
-                sep="|",
-                encoding="latin-1",
-                low_memory=False,
-                on_bad_lines="skip",
-                chunksize=100000,
-            )
-
-            total_records = 0
-            section_counts = {}
-
-            for chunk in chunks:
-                total_records += len(chunk)
-
-                # Count violations by section
-                if "SECTION_OF_ACT" in chunk.columns:
-                    for section, count in chunk["SECTION_OF_ACT"].value_counts().items():
-                        section_counts[section] = section_counts.get(section, 0) + count
+            total_records, section_counts = MSHADataDownloader._count_violation_sections(txt_files[0])
 
             summary = []
             summary.append("# MSHA Violation Statistics")
@@ -286,6 +323,61 @@ class MSHADataDownloader:
         except Exception as e:
             logger.error(f"Error processing violations data: {e}")
 
+    @staticmethod
+    def _count_violation_sections(path: Path):
+        """Count violation records and violations per SECTION_OF_ACT in a streaming pass."""
+        if not PYARROW_AVAILABLE:
+            return MSHADataDownloader._count_violation_sections_pandas(path)
+
+        # Only the section column is decoded; rows arrive in 16 MB record batches
+        reader = pacsv.open_csv(
+            path,
+            read_options=pacsv.ReadOptions(encoding="latin-1", block_size=16 << 20),
+            parse_options=pacsv.ParseOptions(
+                delimiter="|",
+                invalid_row_handler=lambda row: "skip",
+            ),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=["SECTION_OF_ACT"],
+                include_missing_columns=True,
+                column_types={"SECTION_OF_ACT": pa.string()},
+                strings_can_be_null=True,
+            ),
+        )
+
+        total_records = 0
+        section_counts = Counter()
+        for batch in reader:
+            total_records += batch.num_rows
+            counts = pc.value_counts(pc.drop_null(batch.column(0)))
+            section_counts.update(dict(zip(
+                counts.field("values").to_pylist(),
+                counts.field("counts").to_pylist(),
+            )))
+
+        return total_records, section_counts
+
+    @staticmethod
+    def _count_violation_sections_pandas(path: Path):
+        """Fallback for _count_violation_sections when PyArrow is not installed."""
+        # Violations file can be very large, read in chunks
+        chunks = read_dataset_columns(path, ["SECTION_OF_ACT"], chunksize=100000)
+
+        total_records = 0
+        section_counts = pd.Series(dtype="int64")
+
+        for chunk in chunks:
+            total_records += len(chunk)
+
+            # Count violations by section, merging per-chunk counts by index alignment
+            if "SECTION_OF_ACT" in chunk.columns:
+                chunk_counts = chunk["SECTION_OF_ACT"].value_counts()
+                # Categories differ between chunks, so align on plain labels
+                chunk_counts.index = chunk_counts.index.astype(object)
+                section_counts = section_counts.add(chunk_counts, fill_value=0)
+
+        return total_records, section_counts.astype("int64").to_dict()
+
     def run(self):
         """Download all MSHA datasets."""
         logger.info("Starting MSHA data download")
@@ -306,9 +398,11 @@ class MSHADataDownloader:
         self.process_to_knowledge_base()
 
         # Save metadata
-        with open(DATA_DIR / "metadata.json", "w") as f:
-            import json
-            json.dump(self.datasets, f, indent=2)
+        if ORJSON_AVAILABLE:
+            (DATA_DIR / "metadata.json").write_bytes(orjson.dumps(self.datasets, option=orjson.OPT_INDENT_2))
+        else:
+            with open(DATA_DIR / "metadata.json", "w") as f:
+                json.dump(self.datasets, f, indent=2)
 
         elapsed = datetime.now() - start_time
         logger.info("=" * 60)
@@ -12,15 +12,22 @@ Downloads OSHA safety materials relevant to mining:
 
 import os
 import re
-import time
 import json
 import logging
+import random
 import hashlib
+import sqlite3
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from pathlib import Path
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree, html as lxml_html
 
 # Setup paths
 BASE_DIR = Path(__file__).parent
@@ -33,6 +40,34 @@ DOWNLOADS_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 OSHA_DIR.mkdir(exist_ok=True)
 
+# Worker threads shared by every page scrape and PDF download of a run
+MAX_CONCURRENT_DOWNLOADS = 10
+
+# Requests in flight at once against osha.gov, across pages and PDFs
+MAX_REQUESTS_PER_HOST = 10
+
+# Retries for throttling/server errors, and the cap in seconds on any
+# single backoff (a Retry-After header from the server takes precedence)
+MAX_RETRIES = 5
+MAX_RETRY_BACKOFF = 30
+
+# Bytes written per read when streaming a PDF to disk
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Per-URL validators and content hashes from earlier runs, used for
+# conditional GETs and to drop byte-identical PDFs published under two URLs
+CACHE_DB = OSHA_DIR / ".cache.sqlite"
+
+# Elements dropped from a topic page's main content before extracting text
+_DROP_TAGS = ("script", "style", "nav", "footer", etree.Comment)
+
+# Main content container, tried in order
+_MAIN_CONTENT_XPATHS = (
+    "//main",
+    "//article",
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' content ')]",
+)
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -88,6 +123,17 @@ OSHA_SOURCES = {
 }
 
 
+class JitteredRetry(Retry):
+    """
+    Retry with full-jitter exponential backoff: each wait is drawn uniformly
+    from [0, backoff], so workers that failed together do not retry together.
+    A Retry-After header from the server still takes precedence.
+    """
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, min(MAX_RETRY_BACKOFF, super().get_backoff_time()))
+
+
 class OSHADownloader:
     """Downloads OSHA safety content."""
 
@@ -96,17 +142,91 @@ class OSHADownloader:
         self.session.headers.update({
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Mining Safety KB Builder/1.0"
         })
+        # One pooled keep-alive connection per request slot, and retries with
+        # jittered exponential backoff for throttling/server errors that honor
+        # Retry-After. This replaces fixed sleeps between requests.
+        adapter = HTTPAdapter(
+            pool_maxsize=MAX_REQUESTS_PER_HOST,
+            max_retries=JitteredRetry(
+                total=MAX_RETRIES,
+                backoff_factor=1,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                respect_retry_after_header=True,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._request_slots = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+
+        # Task graph of the current run: the worker pool, futures not yet
+        # waited on, and (url, subdir) jobs already scheduled
+        self._pool = None
+        self._tasks = deque()
+        self._scheduled = set()
+        self._scheduled_lock = threading.Lock()
         self.downloaded = []
         self.metadata = []
+        self.topic_sizes = []  # Bytes written per topic text file
+
+        # Shared by the download workers; every access holds _cache_lock
+        self._cache = sqlite3.connect(CACHE_DB, check_same_thread=False)
+        self._cache.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "sha256 TEXT, filepath TEXT, mtime REAL)"
+        )
+        self._cache.execute("CREATE INDEX IF NOT EXISTS downloads_sha256 ON downloads (sha256)")
+        self._cache.commit()
+        self._cache_lock = threading.Lock()
+
+    @contextmanager
+    def _get(self, url: str, **kwargs):
+        """
+        GET url while holding one of the MAX_REQUESTS_PER_HOST request slots.
+        The slot is kept until the block exits, so streamed bodies count too.
+        """
+        with self._request_slots:
+            with self.session.get(url, **kwargs) as response:
+                yield response
+
+    def _cached_download(self, url: str):
+        """Return (etag, last_modified, filepath) from a previous run, if the file is still there."""
+        with self._cache_lock:
+            row = self._cache.execute(
+                "SELECT etag, last_modified, filepath FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+        if row and Path(row[2]).exists():
+            return row
+        return None
+
+    def _remember_download(self, url: str, response, digest: str, filepath: Path) -> Path:
+        """
+        Record a fresh download in the cache. If another URL already produced
+        the same bytes, the new copy is deleted and the existing file returned.
+        """
+        with self._cache_lock:
+            row = self._cache.execute(
+                "SELECT filepath FROM downloads WHERE sha256 = ? AND url != ? AND filepath != ?",
+                (digest, url, str(filepath)),
+            ).fetchone()
+            if row and Path(row[0]).exists():
+                filepath.unlink()
+                filepath = Path(row[0])
+
+            self._cache.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)",
+                (url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 digest, str(filepath), filepath.stat().st_mtime),
+            )
+            self._cache.commit()
+        return filepath
 
     def download_pdf(self, url: str, subdir: str = "") -> bool:
-        """Download a PDF file."""
+        """Download a PDF file (skipped when the server reports it unchanged)."""
         try:
             logger.info(f"Downloading: {url}")
 
-            response = self.session.get(url, timeout=60)
-            response.raise_for_status()
-
             # Get filename from URL
             filename = url.split("/")[-1]
 
@@ -116,37 +236,109 @@ class OSHADownloader:
 
             filepath = save_dir / filename
 
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-
-            size_kb = len(response.content) / 1024
-            logger.info(f"  ✓ Saved: {filename} ({size_kb:.1f} KB)")
+            # Ask only for a changed body when an earlier copy is on disk
+            headers = {}
+            cached = self._cached_download(url)
+            if cached:
+                etag, last_modified, _ = cached
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+            # Stream the body to disk instead of holding the whole PDF in memory
+            total = 0
+            sha256 = hashlib.sha256()
+            with self._get(url, timeout=60, stream=True, headers=headers) as response:
+                if response.status_code == 304:
+                    filepath = Path(cached[2])
+                    total = filepath.stat().st_size
+                    logger.info(f"  = Unchanged: {filepath.name}")
+                else:
+                    response.raise_for_status()
+                    # Written to a .part file and renamed once complete, so an
+                    # interrupted download never leaves a truncated PDF that
+                    # the validator cache and the dedup would treat as whole
+                    part_path = filepath.with_suffix(filepath.suffix + ".part")
+                    with open(part_path, "wb") as f:
+                        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            total += len(chunk)
+                    os.replace(part_path, filepath)
+
+                    filepath = self._remember_download(url, response, sha256.hexdigest(), filepath)
+                    size_kb = total / 1024
+                    logger.info(f"  ✓ Saved: {filepath.name} ({size_kb:.1f} KB)")
 
             self.downloaded.append(str(filepath))
             self.metadata.append({
                 "url": url,
                 "filepath": str(filepath),
-                "size_bytes": len(response.content),
+                "size_bytes": total,
                 "category": subdir or "general",
                 "downloaded_at": datetime.now().isoformat(),
             })
 
-            time.sleep(0.5)  # Rate limiting
             return True
 
         except Exception as e:
             logger.error(f"  ✗ Failed: {e}")
             return False
 
+    @contextmanager
+    def _task_graph(self):
+        """
+        Run everything scheduled inside the block on one shared worker pool
+        and wait for all of it, including tasks that running tasks schedule
+        (e.g. PDFs found on topic pages). Nested use joins the running graph.
+        """
+        if self._pool is not None:
+            yield
+            return
+
+        pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS)
+        self._pool = pool
+        try:
+            yield
+            # A task schedules its children before it finishes, so once the
+            # queue drains nothing is left running
+            while self._tasks:
+                self._tasks.popleft().result()
+        finally:
+            pool.shutdown(wait=True)
+            self._pool = None
+            self._tasks.clear()
+            self._scheduled.clear()
+
+    def _submit(self, fn, *args):
+        """Schedule fn(*args) on the running task graph."""
+        self._tasks.append(self._pool.submit(fn, *args))
+
+    def download_pdfs(self, jobs):
+        """
+        Download (url, subdir) pairs concurrently over the shared session, at
+        most MAX_CONCURRENT_DOWNLOADS at once. Inside a running task graph the
+        jobs are only scheduled; otherwise this waits for them to finish.
+        """
+        with self._task_graph():
+            for job in jobs:
+                with self._scheduled_lock:
+                    if job in self._scheduled:
+                        continue  # Same PDF linked twice is fetched once
+                    self._scheduled.add(job)
+                self._submit(self.download_pdf, *job)
+
     def download_publications(self):
         """Download OSHA publication PDFs."""
         logger.info("=" * 60)
         logger.info("Downloading OSHA Publications (PDFs)")
         logger.info("=" * 60)
 
-        for path in OSHA_SOURCES["publications"]:
-            url = urljoin(OSHA_SOURCES["base_url"], path)
-            self.download_pdf(url, "publications")
+        self.download_pdfs(
+            (urljoin(OSHA_SOURCES["base_url"], path), "publications")
+            for path in OSHA_SOURCES["publications"]
+        )
 
     def scrape_topic_page(self, path: str):
         """Scrape a topic page for content and PDF links."""
@@ -156,54 +348,69 @@ class OSHADownloader:
         logger.info(f"\nScraping topic: {path}")
 
         try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
+            with self._get(url, timeout=30) as response:
+                response.raise_for_status()
+                page = response.text
 
-            soup = BeautifulSoup(response.text, "html.parser")
+            doc = lxml_html.document_fromstring(page)
 
             # Extract main content
-            main_content = soup.find("main") or soup.find("article") or soup.find("div", class_="content")
-
-            if main_content:
+            main_content = None
+            for xpath in _MAIN_CONTENT_XPATHS:
+                matches = doc.xpath(xpath)
+                if matches:
+                    main_content = matches[0]
+                    break
+
+            if main_content is not None:
                 # Remove script/style elements
-                for element in main_content(["script", "style", "nav", "footer"]):
-                    element.decompose()
+                etree.strip_elements(main_content, *_DROP_TAGS, with_tail=False)
 
-                text = main_content.get_text(separator="\n", strip=True)
+                text = "\n".join(s.strip() for s in main_content.itertext() if s.strip())
 
                 # Clean up text
                 lines = [line.strip() for line in text.split("\n") if line.strip()]
                 text = "\n".join(lines)
 
                 if len(text) > 500:
-                    # Save as text file
-                    save_dir = OSHA_DIR / "topics"
-                    save_dir.mkdir(exist_ok=True)
-
-                    filepath = save_dir / f"{topic_name}.txt"
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        f.write(f"Source: {url}\n")
-                        f.write(f"Topic: {topic_name}\n")
-                        f.write(f"Downloaded: {datetime.now().isoformat()}\n")
-                        f.write("=" * 50 + "\n\n")
-                        f.write(text)
-
-                    logger.info(f"  ✓ Saved topic content: {filepath.name}")
-                    self.downloaded.append(str(filepath))
+                    # Save as text file on another worker, so this one goes
+                    # straight on to PDF discovery
+                    payload = (
+                        f"Source: {url}\n"
+                        f"Topic: {topic_name}\n"
+                        f"Downloaded: {datetime.now().isoformat()}\n"
+                        + "=" * 50 + "\n\n"
+                        + text
+                    )
+                    with self._task_graph():
+                        self._submit(self._write_topic_file, OSHA_DIR / "topics" / f"{topic_name}.txt", payload)
 
             # Find PDF links on the page
-            for a in soup.find_all("a", href=True):
-                href = a.get("href", "")
+            pdf_jobs = []
+            for href in doc.xpath("//a/@href"):
                 if ".pdf" in href.lower():
                     pdf_url = urljoin(url, href)
                     if "osha.gov" in pdf_url:
-                        self.download_pdf(pdf_url, f"topics/{topic_name}")
-
-            time.sleep(1)  # Rate limiting
+                        pdf_jobs.append((pdf_url, f"topics/{topic_name}"))
+            self.download_pdfs(pdf_jobs)
 
         except Exception as e:
             logger.error(f"  ✗ Failed to scrape {path}: {e}")
 
+    def _write_topic_file(self, filepath: Path, payload: str):
+        """Write extracted topic page text to disk."""
+        try:
+            data = payload.encode("utf-8")
+            filepath.parent.mkdir(exist_ok=True)
+            with open(filepath, "wb") as f:
+                f.write(data)
+
+            logger.info(f"  ✓ Saved topic content: {filepath.name}")
+            self.downloaded.append(str(filepath))
+            self.topic_sizes.append(len(data))
+        except OSError as e:
+            logger.error(f"  ✗ Failed to save {filepath.name}: {e}")
+
     def download_quick_cards(self):
         """Download OSHA QuickCards (safety pocket guides)."""
         logger.info("\n" + "=" * 60)
@@ -216,9 +423,10 @@ class OSHADownloader:
             "3476", "3477", "3478", "3479", "3480", "3481", "3482",
         ]
 
-        for num in quickcard_numbers:
-            url = f"https://www.osha.gov/sites/default/files/publications/OSHA{num}.pdf"
-            self.download_pdf(url, "quickcards")
+        self.download_pdfs(
+            (f"https://www.osha.gov/sites/default/files/publications/OSHA{num}.pdf", "quickcards")
+            for num in quickcard_numbers
+        )
 
     def run(self):
         """Run all downloads."""
@@ -228,23 +436,27 @@ class OSHADownloader:
 
         start_time = datetime.now()
 
-        # Download publications
-        self.download_publications()
+        # Publications, QuickCards and topic pages (with the PDFs they link)
+        # all run as one task graph, so no phase waits for the previous one
+        with self._task_graph():
+            # Download publications
+            self.download_publications()
 
-        # Download QuickCards
-        self.download_quick_cards()
+            # Download QuickCards
+            self.download_quick_cards()
 
-        # Scrape topic pages
-        logger.info("\n" + "=" * 60)
-        logger.info("Scraping OSHA Topic Pages")
-        logger.info("=" * 60)
+            # Scrape topic pages
+            logger.info("\n" + "=" * 60)
+            logger.info("Scraping OSHA Topic Pages")
+            logger.info("=" * 60)
 
-        for path in OSHA_SOURCES["topic_pages"]:
-            self.scrape_topic_page(path)
+            for path in OSHA_SOURCES["topic_pages"]:
+                self._submit(self.scrape_topic_page, path)
 
         # Save metadata
         with open(OSHA_DIR / "metadata.json", "w") as f:
             json.dump(self.metadata, f, indent=2)
+        self._cache.close()
 
         elapsed = datetime.now() - start_time
 
@@ -260,10 +472,8 @@ class OSHADownloader:
         logger.info(f"  - PDFs: {pdf_count}")
         logger.info(f"  - Text files: {txt_count}")
 
-        # Total size
-        total_size = sum(
-            Path(f).stat().st_size for f in self.downloaded if Path(f).exists()
-        )
+        # Total size, from the byte counts recorded while saving
+        total_size = sum(m["size_bytes"] for m in self.metadata) + sum(self.topic_sizes)
         logger.info(f"Total size: {total_size / 1024 / 1024:.1f} MB")
         logger.info(f"Time elapsed: {elapsed}")
 
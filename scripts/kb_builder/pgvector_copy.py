@@ -0,0 +1,207 @@
+"""
+PGVector Bulk Loader
+
+Embeds chunk batches and loads them into the langchain_postgres tables with
+COPY FROM STDIN. PGVector.add_texts() issues a parameterized INSERT per row;
+COPY streams a whole batch through one statement, which is much cheaper for
+the initial load of a large collection.
+
+The collection itself (and the tables) must already exist, e.g. by creating
+a PGVector for it first.
+
+langchain_pg_embedding is shared by every collection, and the app's own
+collections hold embeddings of other dimensions, so the column is left
+untyped and each collection gets its own partial HNSW index over
+embedding::vector(N). For a large initial load, drop that index first and
+build it once at the end (drop_vector_index / create_vector_index):
+inserting into an indexed table updates the graph row by row and is many
+times slower. Only the collection being loaded is affected, but don't do
+this on a collection that is serving queries.
+"""
+
+import json
+import uuid
+import threading
+
+# pgvector (installed with langchain_postgres) is optional: with it, rows are
+# copied in binary and embeddings are sent as packed floats instead of being
+# formatted as text one dimension at a time
+try:
+    from pgvector.psycopg import register_vector
+    PGVECTOR_AVAILABLE = True
+except ImportError:
+    PGVECTOR_AVAILABLE = False
+
+# Column order matches the rows built in EmbeddingCopier.add_texts
+COPY_SQL = (
+    "COPY langchain_pg_embedding (id, collection_id, embedding, document, cmetadata) "
+    "FROM STDIN"
+)
+COPY_BINARY_SQL = COPY_SQL + " (FORMAT BINARY)"
+COPY_BINARY_TYPES = ["uuid", "uuid", "vector", "text", "jsonb"]
+
+
+# HNSW build parameters (pgvector's defaults)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+# Session settings for the index build; the graph is built much faster when it
+# fits in maintenance_work_mem, and pgvector builds HNSW indexes in parallel
+INDEX_BUILD_WORK_MEM = "4GB"
+INDEX_BUILD_PARALLEL_WORKERS = 7
+
+
+def vector_index_name(collection_id) -> str:
+    """Name of one collection's HNSW index."""
+    return f"langchain_pg_embedding_{uuid.UUID(str(collection_id)).hex}_hnsw_idx"
+
+
+def check_embedding_column(conn, dimensions: int):
+    """
+    Raise ValueError unless the shared embedding column can hold and index
+    this collection's vectors: untyped (any dimensions) or vector(dimensions).
+    """
+    with conn.transaction():
+        row = conn.execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'langchain_pg_embedding'::regclass AND attname = 'embedding'"
+        ).fetchone()
+    if row is None:
+        raise ValueError("langchain_pg_embedding has no embedding column")
+    if row[0] not in ("vector", f"vector({dimensions})"):
+        raise ValueError(
+            f"langchain_pg_embedding.embedding is {row[0]}; cannot index {dimensions}-dimension embeddings"
+        )
+
+
+def drop_vector_index(conn, collection_id, dimensions: int):
+    """
+    Drop one collection's HNSW index, if there is one. Checks the embedding
+    column first, so an upload that could not be indexed fails up front.
+    """
+    check_embedding_column(conn, dimensions)
+    with conn.transaction():
+        conn.execute(f"DROP INDEX IF EXISTS {vector_index_name(collection_id)}")
+
+
+def create_vector_index(conn, collection_id, dimensions: int):
+    """
+    Build one collection's HNSW (cosine) index: a partial index over
+    embedding::vector(dimensions), limited to the collection's rows.
+    """
+    check_embedding_column(conn, dimensions)
+    collection_uuid = uuid.UUID(str(collection_id))
+    with conn.transaction():
+        conn.execute(f"SET LOCAL maintenance_work_mem = '{INDEX_BUILD_WORK_MEM}'")
+        conn.execute(f"SET LOCAL max_parallel_maintenance_workers = {INDEX_BUILD_PARALLEL_WORKERS}")
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {vector_index_name(collection_uuid)} ON langchain_pg_embedding "
+            f"USING hnsw ((embedding::vector({int(dimensions)})) vector_cosine_ops) "
+            f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}) "
+            f"WHERE collection_id = '{collection_uuid}'"
+        )
+
+
+def _vector_literal(vector) -> str:
+    """Format an embedding in pgvector's text input form, e.g. [0.1,0.2]."""
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+class EmbeddingCopier:
+    """
+    Embed texts and COPY them into one collection. Safe to share between
+    threads: each thread gets its own database connection. embeddings may be
+    None if the copier is only used to inspect the collection.
+    """
+
+    def __init__(self, connection_string: str, collection_name: str, embeddings):
+        from sqlalchemy.engine import make_url
+
+        # Accept SQLAlchemy URLs (postgresql+psycopg://...) as used by PGVector
+        url = make_url(connection_string).set(drivername="postgresql")
+        self.conninfo = url.render_as_string(hide_password=False)
+        self.embeddings = embeddings
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.collection_id = self._get_collection_id(collection_name)
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import psycopg
+            conn = psycopg.connect(self.conninfo)
+            if PGVECTOR_AVAILABLE:
+                with conn.transaction():
+                    register_vector(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _get_collection_id(self, collection_name: str):
+        conn = self._connection()
+        with conn.transaction():
+            row = conn.execute(
+                "SELECT uuid FROM langchain_pg_collection WHERE name = %s",
+                (collection_name,),
+            ).fetchone()
+        if row is None:
+            raise ValueError(f"Collection not found: {collection_name}")
+        return row[0]
+
+    def drop_vector_index(self, dimensions: int):
+        """Drop the collection's HNSW index before a bulk load."""
+        drop_vector_index(self._connection(), self.collection_id, dimensions)
+
+    def create_vector_index(self, dimensions: int):
+        """Build the collection's HNSW index after a bulk load."""
+        create_vector_index(self._connection(), self.collection_id, dimensions)
+
+    def uploaded_hashes(self) -> set:
+        """Return the content_hash of every chunk already in the collection."""
+        conn = self._connection()
+        with conn.transaction(), conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT cmetadata->>'content_hash' FROM langchain_pg_embedding WHERE collection_id = %s",
+                (self.collection_id,),
+            )
+            return {row[0] for row in cursor if row[0]}
+
+    def add_texts(self, texts, metadatas, metadata_fields=None) -> int:
+        """
+        Embed one batch and COPY it in a single transaction. Returns the row
+        count. metadatas are dicts, or, with metadata_fields, tuples of the
+        values of those fields; each tuple becomes a dict only as its row is
+        written, so queued batches hold one small tuple per chunk.
+        """
+        vectors = self.embeddings.embed_documents(texts)
+        if metadata_fields is not None:
+            metadatas = (dict(zip(metadata_fields, values)) for values in metadatas)
+
+        conn = self._connection()
+        with conn.transaction(), conn.cursor() as cursor:
+            if PGVECTOR_AVAILABLE:
+                with cursor.copy(COPY_BINARY_SQL) as copy:
+                    copy.set_types(COPY_BINARY_TYPES)
+                    for text, metadata, vector in zip(texts, metadatas, vectors):
+                        copy.write_row((uuid.uuid4(), self.collection_id, vector, text, metadata))
+            else:
+                with cursor.copy(COPY_SQL) as copy:
+                    for text, metadata, vector in zip(texts, metadatas, vectors):
+                        copy.write_row((
+                            str(uuid.uuid4()),
+                            self.collection_id,
+                            _vector_literal(vector),
+                            text,
+                            json.dumps(metadata),
+                        ))
+        return len(texts)
+
+    def close(self):
+        """Close every connection opened by any thread."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -13,10 +13,12 @@ import re
 import json
 import logging
 import hashlib
+import multiprocessing
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Generator
+from typing import List, Dict, Generator, Optional, Tuple
 from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from config import (
     DOWNLOADS_DIR,
@@ -26,6 +28,13 @@ from config import (
     LOGGING_CONFIG,
 )
 
+# orjson is optional: a faster encoder for the chunks JSONL
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Setup logging
 logging.basicConfig(
     level=getattr(logging, LOGGING_CONFIG["level"]),
@@ -37,6 +46,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger("document_processor")
 
+# PDFs with at least this many pages have their pages extracted in parallel
+# (only when not already running inside a per-file worker process)
+PYMUPDF_PARALLEL_MIN_PAGES = 32
+
+# (substring, value) rules for _get_source_info, checked in order against the
+# lowercased path; the first match wins
+_SOURCE_RULES = (
+    ("msha", "msha"),
+    ("osha", "osha"),
+    ("ecfr", "ecfr"),
+    ("niosh", "niosh"),
+)
+_CATEGORY_RULES = (
+    ("regulation", "regulations"),
+    ("cfr", "regulations"),
+    ("training", "training"),
+    ("guidance", "guidance"),
+    ("pib", "guidance"),
+    ("pil", "guidance"),
+    ("fatality", "incident_reports"),
+    ("accident", "incident_reports"),
+    ("compliance", "compliance"),
+)
+
+# Elements whose text never belongs in an HTML document's chunks
+_HTML_DROP_TAGS = ("script", "style", "nav", "footer")
+
+# Identifies how chunk records are built (content_hash algorithm and
+# cross-document dedup); exports from a different format are not reused
+# incrementally
+CHUNK_FORMAT = "blake2b-16+dedup"
+
+
+def _extract_pymupdf_range(filepath: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF with PyMuPDF."""
+    import fitz
+    with fitz.open(filepath) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
 
 @dataclass
 class DocumentChunk:
@@ -93,11 +141,25 @@ class PDFExtractor:
     def _extract_pymupdf(self, filepath: Path) -> str:
         """Extract using PyMuPDF (fitz)."""
         import fitz
-        text_parts = []
         with fitz.open(filepath) as doc:
-            for page in doc:
-                text_parts.append(page.get_text())
-        return "\n\n".join(text_parts)
+            page_count = doc.page_count
+            # Pool workers already keep every core busy with one file each
+            if page_count < PYMUPDF_PARALLEL_MIN_PAGES or multiprocessing.parent_process() is not None:
+                return "\n\n".join(page.get_text() for page in doc)
+
+        # Long document in the main process: split contiguous page ranges
+        # across cores and join them back in page order
+        workers = min(os.cpu_count() or 1, page_count)
+        step = -(-page_count // workers)
+        starts = range(0, page_count, step)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            ranges = executor.map(
+                _extract_pymupdf_range,
+                [str(filepath)] * len(starts),
+                starts,
+                [min(start + step, page_count) for start in starts],
+            )
+            return "\n\n".join(text for page_texts in ranges for text in page_texts)
 
     def _extract_pdfplumber(self, filepath: Path) -> str:
         """Extract using pdfplumber."""
@@ -137,6 +199,27 @@ class PDFExtractor:
         return ""
 
 
+# TextCleaner patterns, compiled once
+_MULTI_NEWLINE_RE = re.compile(r'\n{3,}')
+_MULTI_SPACE_RE = re.compile(r' {2,}')
+_PAGE_NUMBER_LINE_RE = re.compile(r'\n\d+\n')
+_PAGE_X_OF_Y_RE = re.compile(r'Page \d+ of \d+', re.IGNORECASE)
+
+# Single-character fixes applied in one str.translate pass: drop null bytes
+# and C1 control characters, expand ligatures, straighten curly quotes
+_CLEAN_TRANSLATION = str.maketrans({
+    '\x00': None,
+    **{chr(c): None for c in range(0x80, 0xa0)},
+    '\ufb01': 'fi',
+    '\ufb02': 'fl',
+    '\ufb00': 'ff',
+    '\u201c': '"',
+    '\u201d': '"',
+    '\u2018': "'",
+    '\u2019': "'",
+})
+
+
 class TextCleaner:
     """Clean and normalize extracted text."""
 
@@ -147,34 +230,22 @@ class TextCleaner:
             return ""
 
         # Remove excessive whitespace
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = re.sub(r' {2,}', ' ', text)
+        text = _MULTI_NEWLINE_RE.sub('\n\n', text)
+        text = _MULTI_SPACE_RE.sub(' ', text)
 
         # Remove page numbers and headers/footers patterns
-        text = re.sub(r'\n\d+\n', '\n', text)
-        text = re.sub(r'Page \d+ of \d+', '', text, flags=re.IGNORECASE)
+        text = _PAGE_NUMBER_LINE_RE.sub('\n', text)
+        text = _PAGE_X_OF_Y_RE.sub('', text)
 
-        # Remove common PDF artifacts
-        text = re.sub(r'\x00', '', text)  # null bytes
-        text = re.sub(r'[\x80-\x9f]', '', text)  # control characters
-
-        # Fix common OCR issues
-        text = text.replace('ﬁ', 'fi')
-        text = text.replace('ﬂ', 'fl')
-        text = text.replace('ﬀ', 'ff')
-
-        # Normalize quotes
-        text = text.replace('"', '"').replace('"', '"')
-        text = text.replace(''', "'").replace(''', "'")
+        # Remove PDF artifacts, fix OCR ligatures and normalize quotes
+        text = text.translate(_CLEAN_TRANSLATION)
 
         # Clean up lines
-        lines = []
-        for line in text.split('\n'):
-            line = line.strip()
-            if line:
-                lines.append(line)
+        return '\n'.join(line for line in (raw.strip() for raw in text.split('\n')) if line)
+
 
-        return '\n'.join(lines)
+# Sentence boundaries used to split oversized paragraphs
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
 
 
 class TextChunker:
@@ -196,40 +267,54 @@ class TextChunker:
         # Try to split on paragraph boundaries first
         paragraphs = text.split('\n\n')
 
+        # The current chunk is kept as a list of pieces (separators included)
+        # plus its running length, and joined only when flushed, so growing
+        # it never re-copies the text gathered so far
         chunks = []
-        current_chunk = ""
+        parts = []
+        length = 0
 
         for para in paragraphs:
             # If paragraph alone is larger than chunk size, split it
             if len(para) > self.chunk_size:
                 # Save current chunk if exists
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = ""
+                if length:
+                    chunks.append("".join(parts).strip())
+                    parts, length = [], 0
 
                 # Split large paragraph by sentences
-                sentences = re.split(r'(?<=[.!?])\s+', para)
-                for sentence in sentences:
-                    if len(current_chunk) + len(sentence) > self.chunk_size:
-                        if current_chunk:
-                            chunks.append(current_chunk.strip())
-                        current_chunk = sentence
+                for sentence in _SENTENCE_SPLIT_RE.split(para):
+                    if length + len(sentence) > self.chunk_size:
+                        if length:
+                            chunks.append("".join(parts).strip())
+                        parts, length = [sentence], len(sentence)
+                    elif length:
+                        parts += (" ", sentence)
+                        length += 1 + len(sentence)
                     else:
-                        current_chunk += " " + sentence if current_chunk else sentence
+                        parts, length = [sentence], len(sentence)
 
             # If adding paragraph exceeds chunk size, start new chunk
-            elif len(current_chunk) + len(para) + 2 > self.chunk_size:
-                if current_chunk:
+            elif length + len(para) + 2 > self.chunk_size:
+                current_chunk = "".join(parts)
+                if length:
                     chunks.append(current_chunk.strip())
                 # Include overlap from previous chunk
-                overlap_text = current_chunk[-self.chunk_overlap:] if len(current_chunk) > self.chunk_overlap else ""
-                current_chunk = overlap_text + "\n\n" + para if overlap_text else para
+                overlap_text = current_chunk[-self.chunk_overlap:] if length > self.chunk_overlap else ""
+                if overlap_text:
+                    parts = [overlap_text, "\n\n", para]
+                    length = len(overlap_text) + 2 + len(para)
+                else:
+                    parts, length = [para], len(para)
+            elif length:
+                parts += ("\n\n", para)
+                length += 2 + len(para)
             else:
-                current_chunk += "\n\n" + para if current_chunk else para
+                parts, length = [para], len(para)
 
         # Don't forget the last chunk
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if length:
+            chunks.append("".join(parts).strip())
 
         # Filter out tiny chunks
         chunks = [c for c in chunks if len(c) >= 100]
@@ -246,36 +331,16 @@ class DocumentProcessor:
         self.chunker = TextChunker()
         self.processed_count = 0
         self.total_chunks = 0
+        # content_hash of every chunk emitted so far; repeats of the same text
+        # from another document (e.g. republished OSHA guides) are dropped
+        self._seen_chunk_hashes = set()
 
     def _get_source_info(self, filepath: Path) -> Dict:
         """Determine source type and category from file path."""
         path_str = str(filepath).lower()
 
-        # Determine source
-        if "msha" in path_str:
-            source_type = "msha"
-        elif "osha" in path_str:
-            source_type = "osha"
-        elif "ecfr" in path_str:
-            source_type = "ecfr"
-        elif "niosh" in path_str:
-            source_type = "niosh"
-        else:
-            source_type = "other"
-
-        # Determine category
-        if "regulation" in path_str or "cfr" in path_str:
-            category = "regulations"
-        elif "training" in path_str:
-            category = "training"
-        elif "guidance" in path_str or "pib" in path_str or "pil" in path_str:
-            category = "guidance"
-        elif "fatality" in path_str or "accident" in path_str:
-            category = "incident_reports"
-        elif "compliance" in path_str:
-            category = "compliance"
-        else:
-            category = "general"
+        source_type = next((value for needle, value in _SOURCE_RULES if needle in path_str), "other")
+        category = next((value for needle, value in _CATEGORY_RULES if needle in path_str), "general")
 
         return {"source_type": source_type, "category": category}
 
@@ -295,10 +360,17 @@ class DocumentProcessor:
             with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
                 text = f.read()
         elif suffix in [".html", ".htm"]:
-            from bs4 import BeautifulSoup
+            from lxml import etree, html as lxml_html
             with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                soup = BeautifulSoup(f.read(), "html.parser")
-                text = soup.get_text(separator="\n", strip=True)
+                raw = f.read()
+            try:
+                doc = lxml_html.document_fromstring(raw)
+            except (etree.ParserError, ValueError):
+                text = ""
+            else:
+                # Drop non-content elements in one C-level pass, keeping their tail text
+                etree.strip_elements(doc, *_HTML_DROP_TAGS, etree.Comment, with_tail=False)
+                text = "\n".join(s.strip() for s in doc.itertext() if s.strip())
         else:
             logger.warning(f"Unsupported file type: {suffix}")
             return
@@ -321,7 +393,7 @@ class DocumentProcessor:
 
         # Generate chunk objects
         for i, chunk_text in enumerate(chunks):
-            content_hash = hashlib.md5(chunk_text.encode()).hexdigest()
+            content_hash = hashlib.blake2b(chunk_text.encode("utf-8"), digest_size=16).hexdigest()
 
             yield DocumentChunk(
                 content=chunk_text,
@@ -340,33 +412,128 @@ class DocumentProcessor:
         self.processed_count += 1
         self.total_chunks += len(chunks)
 
+    @staticmethod
+    def iter_supported_files(directory: Path) -> Generator[Path, None, None]:
+        """Yield every file under directory with a supported extension."""
+        for entry in _scan_supported_files(directory):
+            yield Path(entry.path)
+
     def process_directory(self, directory: Path) -> Generator[DocumentChunk, None, None]:
         """Process all documents in a directory."""
-        supported_extensions = PROCESSING_CONFIG["supported_extensions"]
+        for filepath in self.iter_supported_files(directory):
+            try:
+                for chunk in self.process_file(filepath):
+                    if chunk.content_hash not in self._seen_chunk_hashes:
+                        self._seen_chunk_hashes.add(chunk.content_hash)
+                        yield chunk
+            except Exception as e:
+                logger.error(f"Error processing {filepath}: {e}")
+
+    def export_for_vectorstore(self, output_file: Path = None, incremental: bool = True):
+        """
+        Export all processed chunks to JSON for vector store upload.
 
-        for filepath in directory.rglob("*"):
-            if filepath.is_file() and filepath.suffix.lower() in supported_extensions:
-                try:
-                    yield from self.process_file(filepath)
-                except Exception as e:
-                    logger.error(f"Error processing {filepath}: {e}")
+        With incremental=True, files whose mtime and size match the manifest
+        of the previous export are not re-extracted; their chunks are copied
+        over from the previous output instead.
 
-    def export_for_vectorstore(self, output_file: Path = None):
-        """Export all processed chunks to JSON for vector store upload."""
+        Chunks whose text was already exported from another document are
+        dropped, and byte-identical files are not extracted at all.
+        """
         output_file = output_file or (PROCESSED_DIR / "chunks.jsonl")
+        manifest_file = output_file.with_suffix(".manifest.json")
 
         logger.info("=" * 60)
         logger.info("Processing all downloaded documents")
         logger.info("=" * 60)
 
-        with open(output_file, "w") as f:
-            for chunk in self.process_directory(DOWNLOADS_DIR):
-                # Write as JSON Lines format
-                f.write(json.dumps(asdict(chunk)) + "\n")
+        files = []
+        stats = {}
+        for entry in _scan_supported_files(DOWNLOADS_DIR):
+            st = entry.stat()
+            files.append(Path(entry.path))
+            stats[entry.path] = [st.st_mtime, st.st_size]
+
+        previous = {}
+        if incremental and output_file.exists() and manifest_file.exists():
+            try:
+                with open(manifest_file, "r") as f:
+                    data = json.load(f)
+                if data.get("chunk_format") == CHUNK_FORMAT:
+                    previous = data["files"]
+            except Exception as e:
+                logger.warning(f"Could not load manifest, processing everything: {e}")
+
+        # Manifest entries are [mtime, size, raw file digest, lost duplicates]
+        unchanged = {key for key, stat in stats.items() if key in previous and previous[key][:2] == stat}
+        if any(key not in unchanged for key in previous):
+            # A document that lost chunks to duplicates elsewhere depends on
+            # those documents; one may have changed or gone, so extract again
+            unchanged = {key for key in unchanged if not previous[key][3]}
+        pending = [filepath for filepath in files if str(filepath) not in unchanged]
+        manifest = {key: previous[key] for key in unchanged}
+        seen_files = {previous[key][2]: key for key in unchanged}
+        logger.info(f"{len(unchanged)} documents unchanged, {len(pending)} to process")
+
+        tmp_output = output_file.with_suffix(output_file.suffix + ".tmp")
+        with open(tmp_output, "wb", buffering=1 << 20) as f:
+            # Carry over chunks of unchanged documents from the previous export
+            if unchanged:
+                with open(output_file, "rb") as old:
+                    for line in old:
+                        record = _load_json_line(line)
+                        if record["source"] in unchanged:
+                            f.write(line)
+                            self._seen_chunk_hashes.add(record["content_hash"])
+                            self.total_chunks += 1
+
+            # Extraction is CPU-bound, so files are processed across cores;
+            # this process is the only writer, keeping the JSONL intact.
+            # Results are written in completion order, so one slow PDF never
+            # holds back the output of files that finished after it.
+            with ProcessPoolExecutor() as executor:
+                futures = {}
+                for filepath in pending:
+                    key = str(filepath)
+                    try:
+                        digest = _file_digest(filepath)
+                    except OSError as e:
+                        logger.error(f"Error reading {filepath}: {e}")
+                        continue
+                    if digest in seen_files:
+                        logger.info(f"Skipping {filepath.name}: identical to {Path(seen_files[digest]).name}")
+                        manifest[key] = stats[key] + [digest, True]
+                        continue
+                    seen_files[digest] = key
+                    futures[executor.submit(_process_file_worker, filepath)] = (key, digest)
+
+                for future in as_completed(futures):
+                    key, digest = futures[future]
+                    chunks = future.result()
+                    if chunks is None:
+                        continue  # Failed: leave out of the manifest so it is retried
+                    lines = []
+                    for content_hash, line in chunks:
+                        if content_hash not in self._seen_chunk_hashes:
+                            self._seen_chunk_hashes.add(content_hash)
+                            lines.append(line)
+                    manifest[key] = stats[key] + [digest, len(lines) < len(chunks)]
+                    if not lines:
+                        continue
+                    self.processed_count += 1
+                    self.total_chunks += len(lines)
+                    f.write(b"".join(lines))
+
+        os.replace(tmp_output, output_file)
+        tmp_manifest = manifest_file.with_suffix(".json.tmp")
+        with open(tmp_manifest, "w") as f:
+            json.dump({"chunk_format": CHUNK_FORMAT, "files": manifest}, f)
+        os.replace(tmp_manifest, manifest_file)
 
         logger.info("=" * 60)
         logger.info(f"Processing complete!")
         logger.info(f"Documents processed: {self.processed_count}")
+        logger.info(f"Documents reused unchanged: {len(unchanged)}")
         logger.info(f"Total chunks generated: {self.total_chunks}")
         logger.info(f"Output file: {output_file}")
         logger.info("=" * 60)
@@ -374,6 +541,65 @@ class DocumentProcessor:
         return output_file
 
 
+def _scan_supported_files(directory: Path) -> Generator[os.DirEntry, None, None]:
+    """
+    Yield a DirEntry for every file under directory with a supported
+    extension. File types come from the directory listing itself, so only
+    the caller's own entry.stat() (cached on the entry) touches each file.
+    """
+    supported_extensions = PROCESSING_CONFIG["supported_extensions"]
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from _scan_supported_files(entry.path)
+            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in supported_extensions:
+                yield entry
+
+
+def _file_digest(filepath: Path) -> str:
+    """BLAKE2b-128 hex digest of a file's raw bytes."""
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def _dump_json_line(record: Dict) -> bytes:
+    """Encode one JSON Lines record."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def _load_json_line(line: bytes) -> Dict:
+    """Decode one JSON Lines record."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+# One processor per worker process, created on first use
+_worker_processor = None
+
+
+def _process_file_worker(filepath: Path) -> Optional[List[Tuple[str, bytes]]]:
+    """
+    Process one file in a pool worker. Returns (content_hash, JSON line) per
+    chunk, already encoded so the parent only dedups and writes (None on error).
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+
+    try:
+        return [
+            (chunk.content_hash, _dump_json_line(asdict(chunk)))
+            for chunk in _worker_processor.process_file(filepath)
+        ]
+    except Exception as e:
+        logger.error(f"Error processing {filepath}: {e}")
+        return None
+
+
 def main():
     """Process all downloaded documents."""
     processor = DocumentProcessor()
@@ -13,9 +13,11 @@ Usage:
 
 import sys
 import argparse
+import importlib
 import logging
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
@@ -34,38 +36,46 @@ logging.basicConfig(
 logger = logging.getLogger("kb_builder")
 
 
-def run_downloaders():
-    """Run all content downloaders."""
-    logger.info("=" * 70)
-    logger.info("PHASE 1: DOWNLOADING CONTENT")
-    logger.info("=" * 70)
-
+# (label, module, class) of every downloader; each runs in its own process
+DOWNLOADERS = [
     # MSHA website content (regulations, training, guidance)
-    logger.info("\n[1/3] MSHA Website Content")
-    try:
-        from download_msha import MSHADownloader
-        downloader = MSHADownloader()
-        downloader.run()
-    except Exception as e:
-        logger.error(f"MSHA download failed: {e}")
-
+    ("MSHA Website Content", "download_msha", "MSHADownloader"),
     # eCFR regulations (Title 30 + OSHA)
-    logger.info("\n[2/3] eCFR Federal Regulations")
-    try:
-        from download_ecfr import ECFRDownloader
-        downloader = ECFRDownloader()
-        downloader.run()
-    except Exception as e:
-        logger.error(f"eCFR download failed: {e}")
-
+    ("eCFR Federal Regulations", "download_ecfr", "ECFRDownloader"),
     # MSHA bulk data (accidents, violations, mines)
-    logger.info("\n[3/3] MSHA Open Government Data")
+    ("MSHA Open Government Data", "download_msha_data", "MSHADataDownloader"),
+]
+
+
+def _run_downloader(label, module_name, class_name):
+    """Run one downloader, logging (not raising) any failure."""
+    logger.info(f"\n{label}")
     try:
-        from download_msha_data import MSHADataDownloader
-        downloader = MSHADataDownloader()
+        module = importlib.import_module(module_name)
+        downloader = getattr(module, class_name)()
         downloader.run()
     except Exception as e:
-        logger.error(f"MSHA data download failed: {e}")
+        logger.error(f"{label} download failed: {e}")
+
+
+def run_downloaders(on_progress=None):
+    """
+    Run all content downloaders concurrently. They fetch from different
+    sites, so none waits on another's network time.
+
+    on_progress, if given, is called in this process each time one or more
+    downloaders finish, while the rest keep downloading.
+    """
+    logger.info("=" * 70)
+    logger.info("PHASE 1: DOWNLOADING CONTENT")
+    logger.info("=" * 70)
+
+    with ProcessPoolExecutor(max_workers=len(DOWNLOADERS)) as pool:
+        pending = {pool.submit(_run_downloader, *downloader) for downloader in DOWNLOADERS}
+        while pending:
+            _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if on_progress:
+                on_progress()
 
 
 def run_processing():
@@ -126,9 +136,11 @@ def main():
     run_all = not (args.download or args.process or args.upload)
 
     if args.download or run_all:
-        run_downloaders()
-
-    if args.process or run_all:
+        # Processing is incremental, so when both phases run it starts on a
+        # finished source's files while the other downloaders are still
+        # going; the pass after the last downloader picks up the rest
+        run_downloaders(on_progress=run_processing if (args.process or run_all) else None)
+    elif args.process:
         run_processing()
 
     if args.upload or run_all:
@@ -0,0 +1,59 @@
+"""
+Upload Checkpoint
+
+Records how far into chunks.jsonl an upload has committed, so a restarted
+upload seeks past the finished part of the file instead of reading and
+decoding it again. Chunks already in the collection are skipped by
+content_hash either way; the checkpoint saves the re-read.
+
+Batches finish out of order, so the checkpoint only advances past a batch
+once it and every batch before it have been uploaded. A failed batch pins it
+for the rest of the run, so its chunks are retried next time.
+"""
+
+import os
+import json
+from pathlib import Path
+
+
+class UploadCheckpoint:
+    """Resume offset for uploading one chunks file into one collection."""
+
+    def __init__(self, chunks_file: Path, collection_name: str):
+        self.path = chunks_file.with_name(chunks_file.name + ".checkpoint")
+        stat = chunks_file.stat()
+        # Only valid for this exact file (a re-export rewrites it) and collection
+        self._key = {
+            "collection": collection_name,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        self._failed = False
+
+    def load(self) -> int:
+        """Byte offset to resume from, or 0 if there is no valid checkpoint."""
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return 0
+        if any(state.get(key) != value for key, value in self._key.items()):
+            return 0
+        return state["offset"]
+
+    def batch_done(self, end_offset: int, uploaded: int) -> int:
+        """
+        Record a finished batch ending at end_offset; batches must be reported
+        in file order. Returns uploaded, the batch's uploaded chunk count.
+        """
+        if not uploaded:
+            self._failed = True
+        if not self._failed:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps({**self._key, "offset": end_offset}))
+            os.replace(tmp_path, self.path)
+        return uploaded
+
+    def finish(self):
+        """Remove the checkpoint once the whole file has been uploaded."""
+        if not self._failed:
+            self.path.unlink(missing_ok=True)
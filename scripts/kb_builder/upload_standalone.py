@@ -7,10 +7,30 @@ Can connect to local or remote database.
 """
 
 import os
+import gc
 import json
+import ctypes
 import logging
 from pathlib import Path
 from datetime import datetime
+from operator import itemgetter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson is optional: a faster decoder for the chunks JSONL
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# glibc's malloc_trim hands freed heap pages back to the OS; without it a long
+# upload keeps its peak resident size even after the batches are released
+try:
+    _libc = ctypes.CDLL("libc.so.6")
+    MALLOC_TRIM_AVAILABLE = hasattr(_libc, "malloc_trim")
+except OSError:
+    MALLOC_TRIM_AVAILABLE = False
 
 # Setup paths
 BASE_DIR = Path(__file__).parent
@@ -28,17 +48,127 @@ logging.basicConfig(
 )
 logger = logging.getLogger("uploader")
 
+# Soft cap on the estimated tokens in one batch (one embeddings request),
+# so a run of long chunks is split instead of producing an outsized request
+MAX_BATCH_TOKENS = 50_000
+
+# Rough tokens per word for English text with OpenAI's tokenizer
+TOKENS_PER_WORD = 1.3
+
+# Dimensions of text-embedding-3-small; the shared embedding column is left
+# untyped (the app stores other sizes) and the collection's index casts to this
+EMBEDDING_DIMENSIONS = 1536
+
+# Batches between _release_memory() calls during an upload
+RELEASE_MEMORY_EVERY = 50
+
+# Inputs per embeddings request (OpenAI's maximum), so each batch goes out as
+# one request instead of being split into sequential ones by embed_documents
+EMBEDDING_CHUNK_SIZE = 2048
+
+
+# Chunk fields stored as vector store metadata; the processor writes all of
+# them for every chunk, so they are read with one itemgetter call per line
+# and queued as a tuple (EmbeddingCopier turns it into the metadata dict)
+METADATA_FIELDS = (
+    "source", "source_type", "category", "title",
+    "chunk_index", "total_chunks", "word_count", "content_hash",
+)
+_get_metadata = itemgetter(*METADATA_FIELDS)
+
+
+def _release_memory():
+    """Collect garbage and return free heap memory to the OS (glibc only)."""
+    gc.collect()
+    if MALLOC_TRIM_AVAILABLE:
+        _libc.malloc_trim(0)
+
+
+def _load_json_line(line: bytes) -> dict:
+    """Decode one JSON Lines record."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def dry_run(chunks_file: Path, connection_string: str, collection_name: str = "foundation_knowledge_base"):
+    """
+    Check the chunks file and the database connection and report what an
+    upload would do, without creating the embeddings client or calling OpenAI.
+    Returns the number of chunks that would be uploaded.
+    """
+    from pgvector_copy import EmbeddingCopier
+
+    logger.info("=" * 60)
+    logger.info("VECTOR STORE UPLOADER (dry run)")
+    logger.info(f"Collection: {collection_name}")
+    logger.info(f"Chunks file: {chunks_file}")
+    logger.info("=" * 60)
+
+    try:
+        copier = EmbeddingCopier(connection_string, collection_name, embeddings=None)
+    except ValueError:
+        logger.info("Collection does not exist yet; every chunk would be uploaded")
+        known_hashes = set()
+    else:
+        known_hashes = copier.uploaded_hashes()
+        copier.close()
+    logger.info(f"Chunks already in collection: {len(known_hashes):,}")
+
+    new_count = 0
+    skipped_count = 0
+    invalid_count = 0
+    new_tokens = 0
+    with open(chunks_file, "rb", buffering=1 << 20) as f:
+        for line_num, line in enumerate(f, 1):
+            try:
+                chunk = _load_json_line(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Invalid JSON at line {line_num}: {e}")
+                invalid_count += 1
+                continue
+
+            if chunk["content_hash"] in known_hashes:
+                skipped_count += 1
+                continue
+            known_hashes.add(chunk["content_hash"])
+            new_count += 1
+            new_tokens += chunk["word_count"] * TOKENS_PER_WORD
+
+    logger.info("=" * 60)
+    logger.info(f"Chunks to upload: {new_count:,} (~{new_tokens:,.0f} tokens to embed)")
+    logger.info(f"Chunks to skip (already uploaded): {skipped_count:,}")
+    logger.info(f"Invalid lines: {invalid_count:,}")
+    logger.info("=" * 60)
+
+    return new_count
+
 
 def upload_to_vectorstore(
     chunks_file: Path,
     connection_string: str,
     collection_name: str = "foundation_knowledge_base",
     batch_size: int = 100,
+    max_concurrent_batches: int = 8,
+    force: bool = False,
+    rebuild_index: bool = False,
 ):
-    """Upload chunks to PGVector database."""
+    """
+    Upload chunks to PGVector database. Chunks whose content_hash is already
+    in the collection are skipped unless force is set.
+
+    Batches are embedded and inserted on max_concurrent_batches threads at
+    once, since each one mostly waits on the embeddings API and the database.
+
+    With rebuild_index, the collection's HNSW index is dropped for the upload and built
+    once afterwards - much faster for a bulk load, but searches are slow in
+    between, so don't use it on a collection that is serving queries.
+    """
 
     from langchain_postgres import PGVector
     from langchain_openai import OpenAIEmbeddings
+    from pgvector_copy import EmbeddingCopier
+    from upload_checkpoint import UploadCheckpoint
 
     logger.info("=" * 60)
     logger.info("VECTOR STORE UPLOADER")
@@ -46,79 +176,126 @@ def upload_to_vectorstore(
     logger.info(f"Chunks file: {chunks_file}")
     logger.info("=" * 60)
 
-    # Initialize embeddings
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    # Initialize embeddings; extra retries (with the client's backoff)
+    # absorb 429s from concurrent batches
+    embeddings = OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        chunk_size=EMBEDDING_CHUNK_SIZE,
+        max_retries=6,
+        request_timeout=60,
+    )
 
-    # Connect to vector store
+    # Connect to vector store (creates the collection if needed); rows are
+    # then loaded with COPY rather than add_texts' per-row INSERTs
     logger.info("Connecting to database...")
-    vectorstore = PGVector(
+    PGVector(
         connection=connection_string,
         collection_name=collection_name,
         embeddings=embeddings,
     )
+    copier = EmbeddingCopier(connection_string, collection_name, embeddings)
+    try:
+        if rebuild_index:
+            logger.info("Dropping vector index for the upload...")
+            copier.drop_vector_index(EMBEDDING_DIMENSIONS)
 
-    # Count total chunks
-    total_chunks = sum(1 for _ in open(chunks_file))
-    logger.info(f"Total chunks to upload: {total_chunks:,}")
+        # Re-runs only embed chunks that are not uploaded yet
+        known_hashes = set() if force else copier.uploaded_hashes()
+        logger.info(f"Chunks already in collection: {len(known_hashes):,}")
+        skipped_count = 0
 
-    # Upload in batches
-    texts = []
-    metadatas = []
-    uploaded_count = 0
-    batch_num = 0
-    start_time = datetime.now()
+        # Progress is reported by bytes read, so the file is not pre-scanned
+        # just to count its lines
+        file_size = chunks_file.stat().st_size
+        logger.info(f"Chunks file size: {file_size / 1024 / 1024:.1f} MB")
 
-    with open(chunks_file, "r") as f:
-        for line_num, line in enumerate(f, 1):
+        # A previous run that stopped part-way resumes after its last fully
+        # uploaded batch
+        checkpoint = UploadCheckpoint(chunks_file, collection_name)
+        start_offset = 0 if force else checkpoint.load()
+
+        def add_batch(batch_num, texts, metadata_rows):
             try:
-                chunk = json.loads(line)
-
-                texts.append(chunk["content"])
-                metadatas.append({
-                    "source": chunk.get("source", ""),
-                    "source_type": chunk.get("source_type", ""),
-                    "category": chunk.get("category", ""),
-                    "title": chunk.get("title", ""),
-                    "chunk_index": chunk.get("chunk_index", 0),
-                    "total_chunks": chunk.get("total_chunks", 0),
-                    "word_count": chunk.get("word_count", 0),
-                    "content_hash": chunk.get("content_hash", ""),
-                })
-
-                # Upload batch
-                if len(texts) >= batch_size:
-                    batch_num += 1
-                    progress = (line_num / total_chunks) * 100
-                    logger.info(f"Uploading batch {batch_num} ({progress:.1f}% - {line_num:,}/{total_chunks:,})...")
-
-                    try:
-                        vectorstore.add_texts(texts=texts, metadatas=metadatas)
-                        uploaded_count += len(texts)
-                    except Exception as e:
-                        logger.error(f"Batch {batch_num} failed: {e}")
-
-                    texts = []
-                    metadatas = []
+                return copier.add_texts(texts, metadata_rows, METADATA_FIELDS)
+            except Exception as e:
+                logger.error(f"Batch {batch_num} failed: {e}")
+                return 0
 
-            except json.JSONDecodeError as e:
-                logger.warning(f"Invalid JSON at line {line_num}: {e}")
-                continue
+        # Upload in batches; at most 2 * max_concurrent_batches are queued so the
+        # file is not read far ahead of the uploads
+        texts = []
+        metadata_rows = []
+        batch_tokens = 0
+        uploaded_count = 0
+        batch_num = 0
+        pending = deque()
+        bytes_read = start_offset
+        start_time = datetime.now()
+
+        with open(chunks_file, "rb", buffering=1 << 20) as f, \
+                ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="upload") as pool:
+            if start_offset:
+                logger.info(f"Resuming from checkpoint ({start_offset / file_size * 100:.1f}% already uploaded)")
+                f.seek(start_offset)
+
+            for line_num, line in enumerate(f, 1):
+                bytes_read += len(line)
+                try:
+                    chunk = _load_json_line(line)
+                    content_hash = chunk["content_hash"]
+                    if content_hash in known_hashes:
+                        skipped_count += 1
+                        continue
+                    known_hashes.add(content_hash)
+
+                    texts.append(chunk["content"])
+                    metadata_rows.append(_get_metadata(chunk))
+                    batch_tokens += chunk["word_count"] * TOKENS_PER_WORD
+
+                    # Upload batch of batch_size chunks or MAX_BATCH_TOKENS
+                    if len(texts) >= batch_size or batch_tokens >= MAX_BATCH_TOKENS:
+                        batch_num += 1
+                        progress = (bytes_read / file_size) * 100
+                        logger.info(f"Uploading batch {batch_num} ({progress:.1f}% - {line_num:,} chunks read)...")
+                        pending.append((pool.submit(add_batch, batch_num, texts, metadata_rows), bytes_read))
+                        if len(pending) >= 2 * max_concurrent_batches:
+                            future, end_offset = pending.popleft()
+                            uploaded_count += checkpoint.batch_done(end_offset, future.result())
+                        if batch_num % RELEASE_MEMORY_EVERY == 0:
+                            _release_memory()
+
+                        texts = []
+                        metadata_rows = []
+                        batch_tokens = 0
 
-    # Upload remaining
-    if texts:
-        batch_num += 1
-        logger.info(f"Uploading final batch {batch_num} ({len(texts)} chunks)...")
-        try:
-            vectorstore.add_texts(texts=texts, metadatas=metadatas)
-            uploaded_count += len(texts)
-        except Exception as e:
-            logger.error(f"Final batch failed: {e}")
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON at line {line_num}: {e}")
+                    continue
+
+            # Upload remaining
+            if texts:
+                batch_num += 1
+                logger.info(f"Uploading final batch {batch_num} ({len(texts)} chunks)...")
+                pending.append((pool.submit(add_batch, batch_num, texts, metadata_rows), bytes_read))
+
+            while pending:
+                future, end_offset = pending.popleft()
+                uploaded_count += checkpoint.batch_done(end_offset, future.result())
+
+        checkpoint.finish()
+
+        if rebuild_index:
+            logger.info("Building vector index...")
+            copier.create_vector_index(EMBEDDING_DIMENSIONS)
+    finally:
+        copier.close()
 
     elapsed = datetime.now() - start_time
 
     logger.info("=" * 60)
     logger.info("UPLOAD COMPLETE")
     logger.info(f"Chunks uploaded: {uploaded_count:,}")
+    logger.info(f"Chunks skipped (already uploaded): {skipped_count:,}")
     logger.info(f"Time elapsed: {elapsed}")
     logger.info("=" * 60)
 
@@ -145,6 +322,27 @@ def main():
         default=100,
         help="Batch size for uploads"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Batches uploaded at once"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Upload every chunk, even ones already in the collection"
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Drop the vector index during the upload and rebuild it after (bulk loads only)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Check the chunks file and database and count what would be uploaded, without calling OpenAI"
+    )
     args = parser.parse_args()
 
     if not args.db_url:
@@ -157,11 +355,18 @@ def main():
         logger.error(f"Chunks file not found: {chunks_file}")
         return
 
+    if args.dry_run:
+        dry_run(chunks_file, args.db_url, args.collection)
+        return
+
     upload_to_vectorstore(
         chunks_file=chunks_file,
         connection_string=args.db_url,
         collection_name=args.collection,
         batch_size=args.batch_size,
+        max_concurrent_batches=args.concurrency,
+        force=args.force,
+        rebuild_index=args.rebuild_index,
     )
 
 
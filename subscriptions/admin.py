@@ -60,13 +60,22 @@ class UserSubscriptionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_usage()
+
     def credits_remaining(self, obj):
+        if hasattr(obj, '_credits_remaining'):
+            return obj._credits_remaining
         return obj.credits_remaining
     credits_remaining.short_description = 'Credits Left'
+    credits_remaining.admin_order_field = '_credits_remaining'
 
     def pdfs_remaining(self, obj):
+        if hasattr(obj, '_pdfs_remaining'):
+            return obj._pdfs_remaining
         return obj.pdfs_remaining
     pdfs_remaining.short_description = 'PDFs Left'
+    pdfs_remaining.admin_order_field = '_pdfs_remaining'
 
 
 @admin.register(CreditTransaction)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from subscriptions.models import UserSubscription
+
+
+class Command(BaseCommand):
+    help = 'Reset monthly usage for every subscription whose billing period has ended (run from cron)'
+
+    def handle(self, *args, **options):
+        count = UserSubscription.reset_expired()
+
+        if count > 0:
+            self.stdout.write(self.style.SUCCESS(f'Reset usage for {count} subscriptions'))
+        else:
+            self.stdout.write('No expired subscriptions')
@@ -1,4 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
 from subscriptions.models import SubscriptionPlan, UserSubscription
 from django.contrib.auth import get_user_model
 
@@ -11,70 +14,54 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Setting up subscription plans...')
 
-        # Create Free plan
-        free_plan, created = SubscriptionPlan.objects.update_or_create(
-            name='free',
-            defaults={
-                'display_name': 'Free',
-                'description': 'Perfect for getting started with safety document management',
-                'credit_limit': 1000,
-                'pdf_limit': 3,
-                'price_monthly': 0,
-                'price_yearly': 0,
-                'is_default': True,
-                'is_active': True,
-                'features': [
+        plans = [
+            SubscriptionPlan(
+                name='free',
+                display_name='Free',
+                description='Perfect for getting started with safety document management',
+                credit_limit=1000,
+                pdf_limit=3,
+                price_monthly=0,
+                price_yearly=0,
+                is_default=True,
+                is_active=True,
+                features=[
                     '1,000 credits per month',
                     '3 PDF uploads',
                     'Basic AI chat support',
                     'Standard response time',
                 ]
-            }
-        )
-        if created:
-            self.stdout.write(self.style.SUCCESS(f'Created Free plan'))
-        else:
-            self.stdout.write(f'Updated Free plan')
-
-        # Create Pro plan
-        pro_plan, created = SubscriptionPlan.objects.update_or_create(
-            name='pro',
-            defaults={
-                'display_name': 'Pro',
-                'description': 'For professionals who need more power and flexibility',
-                'credit_limit': 20000,
-                'pdf_limit': 20,
-                'price_monthly': 19.99,
-                'price_yearly': 199.99,
-                'is_default': False,
-                'is_active': True,
-                'features': [
+            ),
+            SubscriptionPlan(
+                name='pro',
+                display_name='Pro',
+                description='For professionals who need more power and flexibility',
+                credit_limit=20000,
+                pdf_limit=20,
+                price_monthly=19.99,
+                price_yearly=199.99,
+                is_default=False,
+                is_active=True,
+                features=[
                     '20,000 credits per month',
                     '20 PDF uploads',
                     'Priority AI responses',
                     'Advanced analytics',
                     'Email support',
                 ]
-            }
-        )
-        if created:
-            self.stdout.write(self.style.SUCCESS(f'Created Pro plan'))
-        else:
-            self.stdout.write(f'Updated Pro plan')
-
-        # Create Enterprise plan (for future)
-        enterprise_plan, created = SubscriptionPlan.objects.update_or_create(
-            name='enterprise',
-            defaults={
-                'display_name': 'Enterprise',
-                'description': 'Custom solutions for large organizations',
-                'credit_limit': 100000,
-                'pdf_limit': 100,
-                'price_monthly': 99.99,
-                'price_yearly': 999.99,
-                'is_default': False,
-                'is_active': False,  # Not active yet
-                'features': [
+            ),
+            # Enterprise plan (for future)
+            SubscriptionPlan(
+                name='enterprise',
+                display_name='Enterprise',
+                description='Custom solutions for large organizations',
+                credit_limit=100000,
+                pdf_limit=100,
+                price_monthly=99.99,
+                price_yearly=999.99,
+                is_default=False,
+                is_active=False,  # Not active yet
+                features=[
                     '100,000 credits per month',
                     '100 PDF uploads',
                     'Dedicated support',
@@ -82,23 +69,62 @@ class Command(BaseCommand):
                     'Team management',
                     'API access',
                 ]
-            }
-        )
-        if created:
-            self.stdout.write(self.style.SUCCESS(f'Created Enterprise plan (inactive)'))
-        else:
-            self.stdout.write(f'Updated Enterprise plan')
+            ),
+        ]
+
+        # Upsert all plans in one INSERT ... ON CONFLICT (name) DO UPDATE;
+        # bulk_create skips save(), so the single-default rule is applied here
+        with transaction.atomic():
+            existing = set(
+                SubscriptionPlan.objects.filter(name__in=[plan.name for plan in plans]).values_list('name', flat=True)
+            )
+            SubscriptionPlan.objects.bulk_create(
+                plans,
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=[
+                    'display_name', 'description', 'credit_limit', 'pdf_limit',
+                    'price_monthly', 'price_yearly', 'features', 'is_default',
+                    'is_active', 'updated_at',
+                ],
+            )
+            SubscriptionPlan.objects.filter(is_default=True).exclude(name='free').update(is_default=False)
+        # bulk_create and update() send no signals, so clear the cache here
+        SubscriptionPlan.clear_plan_cache()
+
+        for plan in plans:
+            label = f'{plan.display_name} plan' + ('' if plan.is_active else ' (inactive)')
+            if plan.name in existing:
+                self.stdout.write(f'Updated {label}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Created {label}'))
+
+        # On PostgreSQL bulk_create sets each plan's stored primary key from
+        # RETURNING, including for rows that already existed
+        free_plan = plans[0]
 
         # Assign free plan to existing users without subscriptions
-        users_without_sub = User.objects.filter(subscription__isnull=True)
-        count = 0
-        for user in users_without_sub:
-            UserSubscription.objects.create(
-                user=user,
-                plan=free_plan,
-                status='active'
+        # One multi-row INSERT per 1000 users rather than one per user;
+        # bulk_create skips save(), so the billing period is set here
+        period_start = timezone.now()
+        period_end = period_start + relativedelta(months=1)
+        with transaction.atomic():
+            user_ids = list(User.objects.filter(subscription__isnull=True).values_list('id', flat=True))
+            UserSubscription.objects.bulk_create(
+                [
+                    UserSubscription(
+                        user_id=user_id,
+                        plan=free_plan,
+                        status='active',
+                        current_period_start=period_start,
+                        current_period_end=period_end,
+                    )
+                    for user_id in user_ids
+                ],
+                batch_size=1000,
+                ignore_conflicts=True,
             )
-            count += 1
+        count = len(user_ids)
 
         if count > 0:
             self.stdout.write(self.style.SUCCESS(f'Assigned Free plan to {count} existing users'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-16 12:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='usersubscription',
+            index=models.Index(fields=['status', 'current_period_end'], name='sub_status_period_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='usersubscription',
+            index=models.Index(fields=['plan', 'status'], name='sub_plan_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='credittransaction',
+            index=models.Index(fields=['user', 'transaction_type', '-created_at'], name='tx_user_type_date_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='credittransaction',
+            name='credit_tran_transac_0eee54_idx',
+        ),
+    ]
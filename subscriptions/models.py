@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 import uuid
@@ -9,6 +12,10 @@ class SubscriptionPlan(models.Model):
     """
     Defines available subscription plans (Free, Pro, etc.)
     """
+    DEFAULT_PLAN_CACHE_KEY = 'subs:default_plan_id'
+    DEFAULT_PLAN_CACHE_TIMEOUT = 3600
+    PLAN_LIST_CACHE_KEY = 'subs:list_plans'
+    PLAN_LIST_CACHE_TIMEOUT = 300
     PLAN_CHOICES = [
         ('free', 'Free'),
         ('pro', 'Pro'),
@@ -52,11 +59,43 @@ class SubscriptionPlan(models.Model):
             SubscriptionPlan.objects.filter(is_default=True).exclude(pk=self.pk).update(is_default=False)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def get_default_plan_id(cls):
+        """
+        Id of the active default plan (None if there is none), cached since
+        it is needed on every signup but rarely changes.
+        """
+        return cache.get_or_set(
+            cls.DEFAULT_PLAN_CACHE_KEY,
+            lambda: cls.objects.filter(is_default=True, is_active=True).values_list('id', flat=True).first(),
+            cls.DEFAULT_PLAN_CACHE_TIMEOUT,
+        )
+
+    @classmethod
+    def clear_plan_cache(cls):
+        """Forget the cached default plan and plan list after plans change."""
+        cache.delete_many([cls.DEFAULT_PLAN_CACHE_KEY, cls.PLAN_LIST_CACHE_KEY])
+
+
+class UserSubscriptionQuerySet(models.QuerySet):
+    def with_usage(self):
+        """
+        Join the plan and compute the remaining credits/PDFs in SQL, so
+        listing subscriptions needs no per-row plan lookups.
+        """
+        return self.select_related('plan').annotate(
+            _credits_remaining=Greatest(F('plan__credit_limit') - F('credits_used'), 0),
+            _pdfs_remaining=Greatest(F('plan__pdf_limit') - F('pdfs_uploaded'), 0),
+        )
+
 
 class UserSubscription(models.Model):
     """
     Links a user to their subscription plan with usage tracking.
     """
+    # Limits snapshot read by check_limit; cleared by every write below
+    LIMITS_CACHE_KEY = 'subs:limits:{user_id}'
+    LIMITS_CACHE_TIMEOUT = 60
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('cancelled', 'Cancelled'),
@@ -97,8 +136,15 @@ class UserSubscription(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     cancelled_at = models.DateTimeField(null=True, blank=True)
 
+    objects = UserSubscriptionQuerySet.as_manager()
+
     class Meta:
         db_table = 'user_subscriptions'
+        indexes = [
+            # Expired-period lookups for the monthly reset
+            models.Index(fields=['status', 'current_period_end'], name='sub_status_period_idx'),
+            models.Index(fields=['plan', 'status'], name='sub_plan_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.plan.display_name}"
@@ -108,6 +154,24 @@ class UserSubscription(models.Model):
         if not self.current_period_end:
             self.current_period_end = self.current_period_start + relativedelta(months=1)
         super().save(*args, **kwargs)
+        UserSubscription.clear_limits_cache(self.user_id)
+
+    @classmethod
+    def clear_limits_cache(cls, user_id):
+        """Drop the user's cached limits snapshot after a usage or plan change."""
+        cache.delete(cls.LIMITS_CACHE_KEY.format(user_id=user_id))
+
+    def limits_snapshot(self):
+        """The values check_limit needs, as a plain dict for the cache."""
+        return {
+            'credits_remaining': self.credits_remaining,
+            'pdfs_remaining': self.pdfs_remaining,
+            'is_credits_exhausted': self.is_credits_exhausted,
+            'is_pdf_limit_reached': self.is_pdf_limit_reached,
+            'pdf_limit': self.plan.pdf_limit,
+            'current_period_end': self.current_period_end,
+            'status': self.status,
+        }
 
     @property
     def credits_remaining(self):
@@ -136,10 +200,43 @@ class UserSubscription(models.Model):
 
     def reset_monthly_usage(self):
         """Reset credits for new billing period."""
+        now = timezone.now()
+        period_end = now + relativedelta(months=1)
+
+        # Only reset the period this instance saw: if a concurrent request
+        # already started the new period (and may have used credits in it),
+        # take its values instead of resetting again
+        updated = UserSubscription.objects.filter(
+            pk=self.pk, current_period_end=self.current_period_end
+        ).update(
+            credits_used=0,
+            current_period_start=now,
+            current_period_end=period_end,
+            updated_at=now,
+        )
+        if not updated:
+            self.refresh_from_db(fields=['credits_used', 'current_period_start', 'current_period_end', 'updated_at'])
+            return
+        UserSubscription.clear_limits_cache(self.user_id)
+
         self.credits_used = 0
-        self.current_period_start = timezone.now()
-        self.current_period_end = self.current_period_start + relativedelta(months=1)
-        self.save()
+        self.current_period_start = now
+        self.current_period_end = period_end
+        self.updated_at = now
+
+    @classmethod
+    def reset_expired(cls):
+        """
+        Start a new billing period for every active subscription whose
+        period has ended, in one UPDATE. Returns the number reset.
+        """
+        now = timezone.now()
+        return cls.objects.filter(status='active', current_period_end__lt=now).update(
+            credits_used=0,
+            current_period_start=now,
+            current_period_end=now + relativedelta(months=1),
+            updated_at=now,
+        )
 
     def use_credits(self, amount):
         """
@@ -150,11 +247,19 @@ class UserSubscription(models.Model):
         if self.is_period_expired:
             self.reset_monthly_usage()
 
-        if self.credits_used + amount > self.plan.credit_limit:
+        # The limit is checked inside the UPDATE itself, so concurrent
+        # requests cannot both spend the same remaining credits
+        now = timezone.now()
+        updated = UserSubscription.objects.filter(
+            pk=self.pk,
+            credits_used__lte=F('plan__credit_limit') - amount,
+        ).update(credits_used=F('credits_used') + amount, updated_at=now)
+        if not updated:
             return False
+        UserSubscription.clear_limits_cache(self.user_id)
 
         self.credits_used += amount
-        self.save(update_fields=['credits_used', 'updated_at'])
+        self.updated_at = now
         return True
 
     def can_upload_pdf(self):
@@ -163,14 +268,24 @@ class UserSubscription(models.Model):
 
     def increment_pdf_count(self):
         """Increment PDF count after successful upload."""
+        now = timezone.now()
+        UserSubscription.objects.filter(pk=self.pk).update(
+            pdfs_uploaded=F('pdfs_uploaded') + 1, updated_at=now
+        )
+        UserSubscription.clear_limits_cache(self.user_id)
         self.pdfs_uploaded += 1
-        self.save(update_fields=['pdfs_uploaded', 'updated_at'])
+        self.updated_at = now
 
     def decrement_pdf_count(self):
         """Decrement PDF count after deletion."""
-        if self.pdfs_uploaded > 0:
-            self.pdfs_uploaded -= 1
-            self.save(update_fields=['pdfs_uploaded', 'updated_at'])
+        now = timezone.now()
+        updated = UserSubscription.objects.filter(pk=self.pk, pdfs_uploaded__gt=0).update(
+            pdfs_uploaded=F('pdfs_uploaded') - 1, updated_at=now
+        )
+        if updated:
+            UserSubscription.clear_limits_cache(self.user_id)
+            self.pdfs_uploaded = max(0, self.pdfs_uploaded - 1)
+            self.updated_at = now
 
 
 class CreditTransaction(models.Model):
@@ -185,6 +300,9 @@ class CreditTransaction(models.Model):
         ('bonus', 'Bonus Credits'),
         ('reset', 'Monthly Reset'),
     ]
+    # Types that spend credits; the rest (refund, bonus, reset) give credits
+    # back and are granted internally, never on a client's request
+    USAGE_TYPES = ('chat', 'pdf_upload', 'pdf_process')
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(
@@ -202,43 +320,69 @@ class CreditTransaction(models.Model):
     description = models.TextField(blank=True)
     metadata = models.JSONField(default=dict, blank=True, help_text="Additional context (tokens used, session_id, etc.)")
 
-    # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Timestamps; set when the instance is built rather than on insert, since
+    # rows are written later in batches (see txlog)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'credit_transactions'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'created_at']),
-            models.Index(fields=['transaction_type']),
+            # A user's history filtered by type, newest first
+            models.Index(fields=['user', 'transaction_type', '-created_at'], name='tx_user_type_date_idx'),
         ]
 
     def __str__(self):
         return f"{self.user.email} - {self.transaction_type}: {self.amount}"
 
     @classmethod
-    def log_usage(cls, user, transaction_type, amount, description='', metadata=None):
+    def log_usage(cls, user, transaction_type, amount, description='', metadata=None, active_only=False):
         """
-        Log a credit transaction and update user's subscription.
+        Apply a credit transaction to the user's subscription and log it.
         Amount should be positive for usage (will be stored as negative).
+        Returns None if the user has no subscription or too few credits, or
+        (with active_only) if the subscription is not active.
+
+        The balance is updated immediately; the transaction row is queued
+        when the surrounding transaction commits (at once in autocommit) and
+        written in a batch shortly after (see txlog), so the returned
+        instance is not saved yet.
         """
-        subscription = getattr(user, 'subscription', None)
-        if not subscription:
-            return None
+        from . import txlog
 
         # For usage, amount is positive input but stored as negative
         actual_amount = -abs(amount) if transaction_type not in ['refund', 'bonus', 'reset'] else abs(amount)
 
-        # Calculate balance after
-        balance_after = subscription.credits_remaining + actual_amount if actual_amount > 0 else subscription.credits_remaining
+        # One statement checks the limit (for usage), applies the change
+        # and returns the resulting balance; update() cannot return it
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {UserSubscription._meta.db_table} AS s
+                SET credits_used = GREATEST(s.credits_used - %s, 0), updated_at = %s
+                FROM {SubscriptionPlan._meta.db_table} AS p
+                WHERE s.user_id = %s AND p.id = s.plan_id
+                  AND (%s >= 0 OR s.credits_used - %s <= p.credit_limit)
+                  AND (%s OR s.status = 'active')
+                RETURNING p.credit_limit - s.credits_used
+                """,
+                [actual_amount, timezone.now(), user.pk, actual_amount, actual_amount, not active_only],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        UserSubscription.clear_limits_cache(user.pk)
 
-        transaction = cls.objects.create(
+        credit_transaction = cls(
             user=user,
             transaction_type=transaction_type,
             amount=actual_amount,
-            balance_after=max(0, balance_after),
+            balance_after=max(0, row[0]),
             description=description,
             metadata=metadata or {}
         )
+        # A rolled-back balance change must not leave a history row behind
+        transaction.on_commit(lambda: txlog.enqueue(credit_transaction))
 
-        return transaction
+        return credit_transaction
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import SubscriptionPlan, UserSubscription, CreditTransaction
+from .models import SubscriptionPlan, UserSubscription
 
 
 class SubscriptionPlanSerializer(serializers.ModelSerializer):
@@ -16,12 +16,18 @@ class SubscriptionPlanSerializer(serializers.ModelSerializer):
 
 
 class UserSubscriptionSerializer(serializers.ModelSerializer):
-    """Serializer for user subscription details."""
+    """
+    Serializer for user subscription details.
+
+    When serializing many subscriptions, pass a queryset built with
+    UserSubscription.objects.with_usage() so the usage fields come from SQL
+    annotations instead of the plan of each row.
+    """
     plan = SubscriptionPlanSerializer(read_only=True)
-    credits_remaining = serializers.IntegerField(read_only=True)
-    pdfs_remaining = serializers.IntegerField(read_only=True)
-    is_credits_exhausted = serializers.BooleanField(read_only=True)
-    is_pdf_limit_reached = serializers.BooleanField(read_only=True)
+    credits_remaining = serializers.SerializerMethodField()
+    pdfs_remaining = serializers.SerializerMethodField()
+    is_credits_exhausted = serializers.SerializerMethodField()
+    is_pdf_limit_reached = serializers.SerializerMethodField()
 
     class Meta:
         model = UserSubscription
@@ -34,6 +40,22 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
             'created_at'
         ]
 
+    def get_credits_remaining(self, obj):
+        if hasattr(obj, '_credits_remaining'):
+            return obj._credits_remaining
+        return obj.credits_remaining
+
+    def get_pdfs_remaining(self, obj):
+        if hasattr(obj, '_pdfs_remaining'):
+            return obj._pdfs_remaining
+        return obj.pdfs_remaining
+
+    def get_is_credits_exhausted(self, obj):
+        return self.get_credits_remaining(obj) == 0
+
+    def get_is_pdf_limit_reached(self, obj):
+        return self.get_pdfs_remaining(obj) == 0
+
 
 class UsageStatsSerializer(serializers.Serializer):
     """Serializer for usage statistics."""
@@ -55,16 +77,25 @@ class UsageStatsSerializer(serializers.Serializer):
     plan_display_name = serializers.CharField()
 
 
-class CreditTransactionSerializer(serializers.ModelSerializer):
-    """Serializer for credit transactions."""
-
-    class Meta:
-        model = CreditTransaction
-        fields = [
-            'id', 'transaction_type', 'amount',
-            'balance_after', 'description', 'metadata',
-            'created_at'
-        ]
+class CreditTransactionSerializer(serializers.Serializer):
+    """
+    Read-only serializer for credit transactions. A plain Serializer with
+    declared fields, so history pages can be serialized from .values(*FIELDS)
+    rows without model instances or per-request model introspection.
+    """
+    FIELDS = [
+        'id', 'transaction_type', 'amount',
+        'balance_after', 'description', 'metadata',
+        'created_at'
+    ]
+
+    id = serializers.UUIDField(read_only=True)
+    transaction_type = serializers.CharField(read_only=True)
+    amount = serializers.IntegerField(read_only=True)
+    balance_after = serializers.IntegerField(read_only=True)
+    description = serializers.CharField(read_only=True)
+    metadata = serializers.JSONField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
 
 
 class CheckLimitSerializer(serializers.Serializer):
@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 
 from .models import SubscriptionPlan, UserSubscription
+from .utils import get_default_plan_id, subscription_signal_skipped
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -10,35 +11,25 @@ def create_user_subscription(sender, instance, created, **kwargs):
     """
     Auto-assign free plan to new users.
     """
-    if created:
+    # Fixture loads and bulk imports (which use
+    # create_default_subscriptions_bulk) don't go through here
+    if created and not kwargs.get('raw') and not subscription_signal_skipped():
         # Get the default (free) plan
-        default_plan = SubscriptionPlan.objects.filter(is_default=True, is_active=True).first()
+        default_plan_id = get_default_plan_id()
 
-        if not default_plan:
-            # Fallback: get or create the free plan
-            default_plan, _ = SubscriptionPlan.objects.get_or_create(
-                name='free',
-                defaults={
-                    'display_name': 'Free',
-                    'description': 'Free tier with basic features',
-                    'credit_limit': 1000,
-                    'pdf_limit': 3,
-                    'price_monthly': 0,
-                    'price_yearly': 0,
-                    'is_default': True,
-                    'features': [
-                        '1,000 credits per month',
-                        '3 PDF uploads',
-                        'Basic chat support',
-                    ]
-                }
-            )
-
-        # Create subscription for the user
-        UserSubscription.objects.get_or_create(
+        # A user that was just created cannot have a subscription yet, so
+        # this is a plain INSERT (get_or_create adds a SELECT and a savepoint)
+        UserSubscription.objects.create(
             user=instance,
-            defaults={
-                'plan': default_plan,
-                'status': 'active',
-            }
+            plan_id=default_plan_id,
+            status='active',
         )
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+@receiver(post_delete, sender=SubscriptionPlan)
+def clear_plan_cache(sender, **kwargs):
+    """
+    Drop the cached default plan and plan list whenever a plan changes.
+    """
+    SubscriptionPlan.clear_plan_cache()
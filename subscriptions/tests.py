@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import SubscriptionPlan, UserSubscription
+
+
+class ReserveCreditsTests(TestCase):
+    def setUp(self):
+        SubscriptionPlan.objects.create(
+            name='free', display_name='Free', credit_limit=1000, pdf_limit=3, is_default=True
+        )
+        self.user = get_user_model().objects.create_user(
+            username='reserver', email='reserver@example.com', password='password'
+        )
+        UserSubscription.objects.filter(user=self.user).update(credits_used=400)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('subscriptions:reserve-credits')
+
+    def credits_used(self):
+        return UserSubscription.objects.get(user=self.user).credits_used
+
+    def test_usage_is_deducted(self):
+        response = self.client.post(self.url, {'amount': 100, 'action_type': 'chat'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['credits_remaining'], 500)
+        self.assertEqual(self.credits_used(), 500)
+
+    def test_non_usage_action_type_is_rejected(self):
+        for action_type in ('refund', 'bonus', 'reset'):
+            with self.subTest(action_type=action_type):
+                response = self.client.post(
+                    self.url, {'amount': 1000000, 'action_type': action_type}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.credits_used(), 400)
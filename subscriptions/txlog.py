@@ -0,0 +1,107 @@
+"""
+Buffered writer for CreditTransaction rows.
+
+Credit usage is logged on the chat path, so instead of one INSERT per
+request the transactions are queued here and a background thread writes
+them with one bulk_create per FLUSH_INTERVAL (or per BATCH_SIZE rows).
+A batch that fails is retried once and then written row by row, so only
+the rows that cannot be inserted are dropped (and logged).
+The subscription's credits_used is still updated synchronously and is the
+source of truth; rows still queued when the process is killed without
+running its atexit handlers are lost from the history.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.2  # seconds
+RETRY_DELAY = 1  # seconds before retrying a failed batch
+
+_queue = queue.SimpleQueue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(credit_transaction):
+    """Queue an unsaved CreditTransaction to be written shortly."""
+    _ensure_worker()
+    _queue.put(credit_transaction)
+
+
+def flush():
+    """Write every transaction queued so far, on the calling thread."""
+    buffer = []
+    try:
+        while True:
+            buffer.append(_queue.get_nowait())
+    except queue.Empty:
+        pass
+    if buffer:
+        _write(buffer)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='credit-txlog', daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+
+def _run():
+    while True:
+        # Wait for a first transaction, then collect more for up to
+        # FLUSH_INTERVAL so they share one INSERT
+        buffer = [_queue.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        try:
+            while len(buffer) < BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                buffer.append(_queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        _write(buffer)
+
+
+def _write(buffer):
+    from .models import CreditTransaction
+
+    # bulk_create is all-or-nothing, so a failed attempt wrote no rows
+    try:
+        for attempt in range(2):
+            try:
+                CreditTransaction.objects.bulk_create(buffer, batch_size=BATCH_SIZE)
+                return
+            except Exception as e:
+                logger.warning(f"Failed to write {len(buffer)} credit transactions (attempt {attempt + 1}): {e}")
+                # Drops a broken connection, so the retry reconnects
+                close_old_connections()
+                if attempt == 0:
+                    time.sleep(RETRY_DELAY)
+
+        # One bad row fails the whole INSERT; write the rows one at a time so
+        # only the ones that cannot be written are lost
+        for credit_transaction in buffer:
+            try:
+                CreditTransaction.objects.bulk_create([credit_transaction])
+            except Exception as e:
+                logger.error(
+                    f"Failed to write credit transaction for user {credit_transaction.user_id} "
+                    f"({credit_transaction.transaction_type}, {credit_transaction.amount}): {e}"
+                )
+                close_old_connections()
+    finally:
+        close_old_connections()
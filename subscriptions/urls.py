@@ -15,5 +15,6 @@ urlpatterns = [
     # Actions
     path('check-limit/', views.check_limit, name='check-limit'),
     path('use-credits/', views.use_credits, name='use-credits'),
+    path('reserve-credits/', views.reserve_credits, name='reserve-credits'),
     path('upgrade/', views.upgrade_plan, name='upgrade-plan'),
 ]
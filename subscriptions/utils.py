@@ -3,24 +3,140 @@ Utility functions for subscription limit checking.
 Use these in other views to enforce limits.
 """
 
-from .models import UserSubscription, CreditTransaction
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from .models import SubscriptionPlan, UserSubscription, CreditTransaction
+
+_signal_state = threading.local()
+
+# Completed-PDF count shown by usage_stats; dashboards poll it, and PDFs are
+# uploaded at human pace, so it is cached briefly
+COMPLETED_PDFS_CACHE_KEY = 'subs:pdfs_completed:{user_id}'
+COMPLETED_PDFS_CACHE_TIMEOUT = 30
+
+
+def get_default_plan_id():
+    """
+    Get the default plan's id, creating the free plan if there is none.
+    """
+    default_plan_id = SubscriptionPlan.get_default_plan_id()
+    if default_plan_id:
+        return default_plan_id
+
+    # Fallback: get or create the free plan
+    default_plan, _ = SubscriptionPlan.objects.get_or_create(
+        name='free',
+        defaults={
+            'display_name': 'Free',
+            'description': 'Free tier with basic features',
+            'credit_limit': 1000,
+            'pdf_limit': 3,
+            'price_monthly': 0,
+            'price_yearly': 0,
+            'is_default': True,
+            'features': [
+                '1,000 credits per month',
+                '3 PDF uploads',
+                'Basic chat support',
+            ]
+        }
+    )
+    return default_plan.pk
+
+
+@contextmanager
+def skip_subscription_signal():
+    """
+    Don't create subscriptions for users created in this block (on this
+    thread); use with create_default_subscriptions_bulk for bulk imports.
+    """
+    previous = getattr(_signal_state, 'skip', False)
+    _signal_state.skip = True
+    try:
+        yield
+    finally:
+        _signal_state.skip = previous
+
+
+def subscription_signal_skipped():
+    """Whether skip_subscription_signal() is active on this thread."""
+    return getattr(_signal_state, 'skip', False)
+
+
+def create_default_subscriptions_bulk(users, batch_size=500):
+    """
+    Give users the default plan with one INSERT per batch_size users.
+    Users that already have a subscription are left as they are.
+    """
+    default_plan_id = get_default_plan_id()
+
+    # bulk_create skips save(), so the billing period is set here
+    period_start = timezone.now()
+    period_end = period_start + relativedelta(months=1)
+    return UserSubscription.objects.bulk_create(
+        [
+            UserSubscription(
+                user_id=user.pk,
+                plan_id=default_plan_id,
+                status='active',
+                current_period_start=period_start,
+                current_period_end=period_end,
+            )
+            for user in users
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
 
 
 def get_user_subscription(user):
     """
     Get user's subscription, handling cases where it doesn't exist.
     """
+    if getattr(user, 'pk', None) is None:
+        return None
+
+    # Load the plan in the same query; nearly every caller reads its limits
     try:
-        subscription = user.subscription
+        subscription = UserSubscription.objects.select_related('plan').get(user=user)
+    except UserSubscription.DoesNotExist:
+        return None
 
-        # Check if period expired and reset if needed
-        if subscription.is_period_expired:
-            subscription.reset_monthly_usage()
+    # Check if period expired and reset if needed
+    if subscription.is_period_expired:
+        subscription.reset_monthly_usage()
 
-        return subscription
-    except (UserSubscription.DoesNotExist, AttributeError):
+    return subscription
+
+
+def get_limits_snapshot(user):
+    """
+    Get the user's limits as check_limit reads them, from the cache when
+    possible (see UserSubscription.limits_snapshot). Returns None if the
+    user has no subscription.
+    """
+    cache_key = UserSubscription.LIMITS_CACHE_KEY.format(user_id=user.pk)
+    snapshot = cache.get(cache_key)
+
+    # A snapshot from an ended period is reloaded, so the period is reset
+    if snapshot is not None:
+        period_end = snapshot['current_period_end']
+        if not period_end or timezone.now() <= period_end:
+            return snapshot
+
+    subscription = get_user_subscription(user)
+    if not subscription:
         return None
 
+    snapshot = subscription.limits_snapshot()
+    cache.set(cache_key, snapshot, UserSubscription.LIMITS_CACHE_TIMEOUT)
+    return snapshot
+
 
 def can_use_credits(user, amount=0):
     """
@@ -68,30 +184,51 @@ def use_credits(user, amount, action_type='chat', description='', metadata=None)
     Deduct credits from user's subscription.
     Returns (bool, error_message, remaining_credits)
     """
+    # log_usage gives credits back for non-usage types; this only spends them
+    if action_type not in CreditTransaction.USAGE_TYPES:
+        return False, f"Invalid action type: {action_type}", 0
+
     subscription = get_user_subscription(user)
 
     if not subscription:
         return False, "No active subscription", 0
 
-    if not subscription.use_credits(amount):
-        return False, "Insufficient credits", subscription.credits_remaining
-
-    # Log the transaction
-    CreditTransaction.log_usage(
+    # Deduct the credits and queue the transaction log entry
+    credit_transaction = CreditTransaction.log_usage(
         user=user,
         transaction_type=action_type,
         amount=amount,
         description=description,
         metadata=metadata or {}
     )
+    if not credit_transaction:
+        return False, "Insufficient credits", subscription.credits_remaining
 
-    return True, None, subscription.credits_remaining
+    return True, None, credit_transaction.balance_after
+
+
+def get_completed_pdf_count(user):
+    """
+    Count the user's completed PDFs (cached for COMPLETED_PDFS_CACHE_TIMEOUT).
+    """
+    from chatlog.models import UploadedPDF
+
+    # Joins the knowledge base by its unique username in the same query
+    return cache.get_or_set(
+        COMPLETED_PDFS_CACHE_KEY.format(user_id=user.pk),
+        lambda: UploadedPDF.objects.filter(
+            user_knowledge_base__username=user.username,
+            status='completed'
+        ).count(),
+        COMPLETED_PDFS_CACHE_TIMEOUT,
+    )
 
 
 def increment_pdf_count(user):
     """
     Increment PDF count after successful upload.
     """
+    cache.delete(COMPLETED_PDFS_CACHE_KEY.format(user_id=user.pk))
     subscription = get_user_subscription(user)
     if subscription:
         subscription.increment_pdf_count()
@@ -103,6 +240,7 @@ def decrement_pdf_count(user):
     """
     Decrement PDF count after deletion.
     """
+    cache.delete(COMPLETED_PDFS_CACHE_KEY.format(user_id=user.pk))
     subscription = get_user_subscription(user)
     if subscription:
         subscription.decrement_pdf_count()
@@ -2,6 +2,8 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from django.core.cache import cache
+from django.db.models import Count, Window
 from django.utils import timezone
 from datetime import timedelta
 
@@ -14,6 +16,7 @@ from .serializers import (
     CheckLimitSerializer,
     CheckLimitResponseSerializer,
 )
+from .utils import get_user_subscription, get_limits_snapshot, get_completed_pdf_count
 
 
 @api_view(['GET'])
@@ -22,10 +25,16 @@ def list_plans(request):
     """
     List all available subscription plans.
     """
-    plans = SubscriptionPlan.objects.filter(is_active=True)
-    serializer = SubscriptionPlanSerializer(plans, many=True)
+    # Plans rarely change and this is hit on every pricing page view, so the
+    # serialized list is cached (cleared by the plan post_save/delete signal)
+    data = cache.get(SubscriptionPlan.PLAN_LIST_CACHE_KEY)
+    if data is None:
+        plans = SubscriptionPlan.objects.filter(is_active=True)
+        data = SubscriptionPlanSerializer(plans, many=True).data
+        cache.set(SubscriptionPlan.PLAN_LIST_CACHE_KEY, data, SubscriptionPlan.PLAN_LIST_CACHE_TIMEOUT)
+
     return Response({
-        'plans': serializer.data
+        'plans': data
     })
 
 
@@ -35,21 +44,16 @@ def current_subscription(request):
     """
     Get the current user's subscription details.
     """
-    try:
-        subscription = request.user.subscription
-
-        # Check if period expired and reset if needed
-        if subscription.is_period_expired:
-            subscription.reset_monthly_usage()
-
-        serializer = UserSubscriptionSerializer(subscription)
-        return Response(serializer.data)
-    except UserSubscription.DoesNotExist:
+    subscription = get_user_subscription(request.user)
+    if subscription is None:
         return Response(
             {'error': 'No subscription found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    serializer = UserSubscriptionSerializer(subscription)
+    return Response(serializer.data)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -57,64 +61,52 @@ def usage_stats(request):
     """
     Get detailed usage statistics for the current user.
     """
+    subscription = get_user_subscription(request.user)
+    if subscription is None:
+        return Response(
+            {'error': 'No subscription found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    plan = subscription.plan
+
+    # Calculate days remaining in period
+    days_remaining = 0
+    if subscription.current_period_end:
+        delta = subscription.current_period_end - timezone.now()
+        days_remaining = max(0, delta.days)
+
+    # Count actual completed PDFs from database (more accurate than counter)
     try:
-        subscription = request.user.subscription
-
-        # Check if period expired and reset if needed
-        if subscription.is_period_expired:
-            subscription.reset_monthly_usage()
-
-        plan = subscription.plan
-
-        # Calculate days remaining in period
-        days_remaining = 0
-        if subscription.current_period_end:
-            delta = subscription.current_period_end - timezone.now()
-            days_remaining = max(0, delta.days)
-
-        # Count actual completed PDFs from database (more accurate than counter)
-        from chatlog.models import UserKnowledgeBase, UploadedPDF
-        actual_pdfs = 0
-        try:
-            user_kb = UserKnowledgeBase.objects.filter(username=request.user.username).first()
-            if user_kb:
-                actual_pdfs = UploadedPDF.objects.filter(
-                    user_knowledge_base=user_kb,
-                    status='completed'
-                ).count()
-        except Exception:
-            actual_pdfs = subscription.pdfs_uploaded  # Fallback to counter
-
-        # Calculate percentages
-        credits_percentage = (subscription.credits_used / plan.credit_limit * 100) if plan.credit_limit > 0 else 0
-        pdfs_percentage = (actual_pdfs / plan.pdf_limit * 100) if plan.pdf_limit > 0 else 0
-
-        data = {
-            'credits_used': subscription.credits_used,
-            'credits_remaining': subscription.credits_remaining,
-            'credits_limit': plan.credit_limit,
-            'credits_percentage': round(credits_percentage, 1),
+        actual_pdfs = get_completed_pdf_count(request.user)
+    except Exception:
+        actual_pdfs = subscription.pdfs_uploaded  # Fallback to counter
 
-            'pdfs_uploaded': actual_pdfs,  # Use actual count instead of counter
-            'pdfs_remaining': max(0, plan.pdf_limit - actual_pdfs),
-            'pdfs_limit': plan.pdf_limit,
-            'pdfs_percentage': round(pdfs_percentage, 1),
+    # Calculate percentages
+    credits_percentage = (subscription.credits_used / plan.credit_limit * 100) if plan.credit_limit > 0 else 0
+    pdfs_percentage = (actual_pdfs / plan.pdf_limit * 100) if plan.pdf_limit > 0 else 0
 
-            'current_period_start': subscription.current_period_start,
-            'current_period_end': subscription.current_period_end,
-            'days_remaining': days_remaining,
+    data = {
+        'credits_used': subscription.credits_used,
+        'credits_remaining': subscription.credits_remaining,
+        'credits_limit': plan.credit_limit,
+        'credits_percentage': round(credits_percentage, 1),
 
-            'plan_name': plan.name,
-            'plan_display_name': plan.display_name,
-        }
+        'pdfs_uploaded': actual_pdfs,  # Use actual count instead of counter
+        'pdfs_remaining': max(0, plan.pdf_limit - actual_pdfs),
+        'pdfs_limit': plan.pdf_limit,
+        'pdfs_percentage': round(pdfs_percentage, 1),
 
-        serializer = UsageStatsSerializer(data)
-        return Response(serializer.data)
-    except UserSubscription.DoesNotExist:
-        return Response(
-            {'error': 'No subscription found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+        'current_period_start': subscription.current_period_start,
+        'current_period_end': subscription.current_period_end,
+        'days_remaining': days_remaining,
+
+        'plan_name': plan.name,
+        'plan_display_name': plan.display_name,
+    }
+
+    serializer = UsageStatsSerializer(data)
+    return Response(serializer.data)
 
 
 @api_view(['GET'])
@@ -128,18 +120,37 @@ def transaction_history(request):
     offset = int(request.query_params.get('offset', 0))
     transaction_type = request.query_params.get('type', None)
 
-    transactions = CreditTransaction.objects.filter(user=request.user)
+    # Ordered explicitly rather than through Meta.ordering: newest first is
+    # what the (user, created_at) and (user, transaction_type, -created_at)
+    # indexes serve as a range scan, with no separate sort
+    transactions = CreditTransaction.objects.filter(user=request.user).order_by('-created_at')
 
     if transaction_type:
         transactions = transactions.filter(transaction_type=transaction_type)
 
-    total = transactions.count()
-    transactions = transactions[offset:offset + limit]
-
-    serializer = CreditTransactionSerializer(transactions, many=True)
+    # The serializer reads only the transaction's own columns (no relations),
+    # so the page is fetched as plain rows of exactly those columns. The
+    # total comes back on every row as COUNT(*) OVER (), in the same query,
+    # and one extra row tells whether another page follows
+    rows = list(
+        transactions
+        .annotate(_total=Window(expression=Count('*')))
+        .values(*CreditTransactionSerializer.FIELDS, '_total')[offset:offset + limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if rows:
+        total = rows[0]['_total']
+    else:
+        # Past the last page there is no row to carry the total
+        total = transactions.count() if offset else 0
+
+    serializer = CreditTransactionSerializer(rows, many=True)
     return Response({
         'transactions': serializer.data,
         'total': total,
+        'has_more': has_more,
         'limit': limit,
         'offset': offset
     })
@@ -150,7 +161,8 @@ def transaction_history(request):
 def check_limit(request):
     """
     Check if a user can perform an action based on their limits.
-    Used before chat or PDF upload.
+    Used before PDF upload; for chat, prefer reserve_credits, which checks
+    and deducts in one call (check_limit + use_credits is the legacy flow).
     """
     serializer = CheckLimitSerializer(data=request.data)
     if not serializer.is_valid():
@@ -159,51 +171,47 @@ def check_limit(request):
     action = serializer.validated_data['action']
     credits_needed = serializer.validated_data.get('credits_needed', 0)
 
-    try:
-        subscription = request.user.subscription
-
-        # Check if period expired and reset if needed
-        if subscription.is_period_expired:
-            subscription.reset_monthly_usage()
-
-        response_data = {
-            'allowed': True,
-            'reason': '',
-            'credits_remaining': subscription.credits_remaining,
-            'pdfs_remaining': subscription.pdfs_remaining,
-            'upgrade_required': False
-        }
-
-        if action == 'chat':
-            if subscription.is_credits_exhausted:
-                response_data['allowed'] = False
-                response_data['reason'] = 'You have exhausted your monthly credits. Please upgrade to continue.'
-                response_data['upgrade_required'] = True
-            elif credits_needed > 0 and subscription.credits_remaining < credits_needed:
-                response_data['allowed'] = False
-                response_data['reason'] = f'Insufficient credits. You need {credits_needed} but have {subscription.credits_remaining}.'
-                response_data['upgrade_required'] = True
-
-        elif action == 'pdf_upload':
-            if subscription.is_pdf_limit_reached:
-                response_data['allowed'] = False
-                response_data['reason'] = f'You have reached your PDF limit ({subscription.plan.pdf_limit}). Please upgrade or delete existing PDFs.'
-                response_data['upgrade_required'] = True
-
-        return Response(response_data)
-
-    except UserSubscription.DoesNotExist:
+    # Called before every chat, so the limits come from the cached snapshot
+    limits = get_limits_snapshot(request.user)
+    if limits is None:
         return Response(
             {'error': 'No subscription found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    response_data = {
+        'allowed': True,
+        'reason': '',
+        'credits_remaining': limits['credits_remaining'],
+        'pdfs_remaining': limits['pdfs_remaining'],
+        'upgrade_required': False
+    }
+
+    if action == 'chat':
+        if limits['is_credits_exhausted']:
+            response_data['allowed'] = False
+            response_data['reason'] = 'You have exhausted your monthly credits. Please upgrade to continue.'
+            response_data['upgrade_required'] = True
+        elif credits_needed > 0 and limits['credits_remaining'] < credits_needed:
+            response_data['allowed'] = False
+            response_data['reason'] = f'Insufficient credits. You need {credits_needed} but have {limits["credits_remaining"]}.'
+            response_data['upgrade_required'] = True
+
+    elif action == 'pdf_upload':
+        if limits['is_pdf_limit_reached']:
+            response_data['allowed'] = False
+            response_data['reason'] = f'You have reached your PDF limit ({limits["pdf_limit"]}). Please upgrade or delete existing PDFs.'
+            response_data['upgrade_required'] = True
+
+    return Response(response_data)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def use_credits(request):
     """
     Deduct credits for an action (called after successful chat/operation).
+    Legacy: new clients should use reserve_credits.
     """
     amount = request.data.get('amount', 0)
     action_type = request.data.get('action_type', 'chat')
@@ -216,43 +224,105 @@ def use_credits(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    try:
-        subscription = request.user.subscription
-
-        # Check if period expired and reset if needed
-        if subscription.is_period_expired:
-            subscription.reset_monthly_usage()
-
-        # Try to use credits
-        if subscription.use_credits(amount):
-            # Log the transaction
-            CreditTransaction.log_usage(
-                user=request.user,
-                transaction_type=action_type,
-                amount=amount,
-                description=description,
-                metadata=metadata
-            )
-
-            return Response({
-                'success': True,
-                'credits_used': amount,
-                'credits_remaining': subscription.credits_remaining
-            })
-        else:
-            return Response({
-                'success': False,
-                'error': 'Insufficient credits',
-                'credits_remaining': subscription.credits_remaining,
-                'upgrade_required': True
-            }, status=status.HTTP_402_PAYMENT_REQUIRED)
-
-    except UserSubscription.DoesNotExist:
+    if action_type not in CreditTransaction.USAGE_TYPES:
+        return Response(
+            {'error': f'Invalid action type: {action_type}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    subscription = get_user_subscription(request.user)
+    if subscription is None:
         return Response(
             {'error': 'No subscription found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    # Deduct the credits and queue the transaction log entry
+    credit_transaction = CreditTransaction.log_usage(
+        user=request.user,
+        transaction_type=action_type,
+        amount=amount,
+        description=description,
+        metadata=metadata
+    )
+    if credit_transaction:
+        return Response({
+            'success': True,
+            'credits_used': amount,
+            'credits_remaining': credit_transaction.balance_after
+        })
+    else:
+        return Response({
+            'success': False,
+            'error': 'Insufficient credits',
+            'credits_remaining': subscription.credits_remaining,
+            'upgrade_required': True
+        }, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reserve_credits(request):
+    """
+    Check the user's limit and deduct credits for an action in one step.
+    Replaces calling check_limit and then use_credits for chat.
+    """
+    amount = request.data.get('amount', 0)
+    action_type = request.data.get('action_type', 'chat')
+    description = request.data.get('description', '')
+    metadata = request.data.get('metadata', {})
+
+    if amount <= 0:
+        return Response(
+            {'error': 'Amount must be positive'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Refunds and bonuses would add credits; only usage can be reserved
+    if action_type not in CreditTransaction.USAGE_TYPES:
+        return Response(
+            {'error': f'Invalid action type: {action_type}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Loading the subscription starts a new billing period if the last one
+    # has ended, so the credits are checked against (and charged to) the
+    # current period
+    subscription = get_user_subscription(request.user)
+    if subscription is None:
+        return Response(
+            {'error': 'No subscription found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # One conditional UPDATE checks the limit and the status and deducts, so
+    # nothing can spend the credits between the check and the deduction
+    credit_transaction = CreditTransaction.log_usage(
+        user=request.user,
+        transaction_type=action_type,
+        amount=amount,
+        description=description,
+        metadata=metadata,
+        active_only=True,
+    )
+    if credit_transaction:
+        return Response({
+            'success': True,
+            'credits_used': amount,
+            'credits_remaining': credit_transaction.balance_after
+        })
+
+    if subscription.status != 'active':
+        error = 'Subscription is not active'
+    else:
+        error = f'Insufficient credits. You need {amount} but have {subscription.credits_remaining}.'
+    return Response({
+        'success': False,
+        'error': error,
+        'credits_remaining': subscription.credits_remaining,
+        'upgrade_required': True
+    }, status=status.HTTP_402_PAYMENT_REQUIRED)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -278,23 +348,22 @@ def upgrade_plan(request):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    try:
-        subscription = request.user.subscription
-        old_plan = subscription.plan
-
-        # Update the plan
-        subscription.plan = new_plan
-        subscription.status = 'active'
-        subscription.save()
-
-        return Response({
-            'success': True,
-            'message': f'Successfully upgraded from {old_plan.display_name} to {new_plan.display_name}',
-            'new_plan': SubscriptionPlanSerializer(new_plan).data
-        })
-
-    except UserSubscription.DoesNotExist:
+    # Only the old plan's name is needed for the message, and the switch is
+    # a narrow UPDATE of the two columns rather than a load and full save()
+    subscription = UserSubscription.objects.filter(user=request.user)
+    old_plan_name = subscription.values_list('plan__display_name', flat=True).first()
+    updated = 0
+    if old_plan_name is not None:
+        updated = subscription.update(plan=new_plan, status='active', updated_at=timezone.now())
+        UserSubscription.clear_limits_cache(request.user.pk)
+    if not updated:
         return Response(
             {'error': 'No subscription found'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+    return Response({
+        'success': True,
+        'message': f'Successfully upgraded from {old_plan_name} to {new_plan.display_name}',
+        'new_plan': SubscriptionPlanSerializer(new_plan).data
+    })
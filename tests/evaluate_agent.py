@@ -22,10 +22,21 @@ Usage:
     python tests/evaluate_agent.py --test 1
 """
 import os
+import re
 import sys
 import json
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+# pyahocorasick is optional: it finds every expected topic in one pass over
+# the answer instead of one substring scan per topic
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -101,17 +112,54 @@ EVAL_DATA = [
 # EVALUATION FUNCTIONS
 # ===================================
 
-def calculate_topic_coverage(answer: str, expected_topics: list) -> tuple:
+# Response quality markers; each list is compiled into one regex so an answer
+# is scanned once per check instead of once per marker
+STRUCTURE_MARKERS = ["##", "**", "1.", "- ", "* "]
+CITATION_MARKERS = ["CFR", "MSHA", "OSHA", "30 CFR"]
+ACTION_MARKERS = ["recommend", "action", "should", "must", "required"]
+
+
+def _compile_markers(markers: list):
+    return re.compile("|".join(map(re.escape, markers)))
+
+
+_STRUCTURE_RE = _compile_markers(STRUCTURE_MARKERS)
+# Citations and action items are case-insensitive: they are matched in
+# lowercase against the lowercased answer
+_CITATION_RE = _compile_markers([marker.lower() for marker in CITATION_MARKERS])
+_ACTION_RE = _compile_markers([marker.lower() for marker in ACTION_MARKERS])
+
+
+@lru_cache(maxsize=None)
+def _topic_automaton(topics: tuple):
+    """Aho-Corasick automaton over the lowercased topics, built once per topic set."""
+    automaton = ahocorasick.Automaton()
+    for topic in topics:
+        automaton.add_word(topic.lower(), topic.lower())
+    automaton.make_automaton()
+    return automaton
+
+
+def calculate_topic_coverage(answer: str, expected_topics: list, answer_lower: str = None) -> tuple:
     """
     Calculate what percentage of expected topics are mentioned in the answer.
+    Pass answer_lower if the caller has already lowercased the answer.
     Returns (coverage_score, found_topics, missing_topics)
     """
-    answer_lower = answer.lower()
+    if answer_lower is None:
+        answer_lower = answer.lower()
     found_topics = []
     missing_topics = []
 
+    if AHOCORASICK_AVAILABLE and expected_topics:
+        # One pass over the answer collects every topic it mentions
+        automaton = _topic_automaton(tuple(expected_topics))
+        is_mentioned = {topic for _, topic in automaton.iter(answer_lower)}.__contains__
+    else:
+        is_mentioned = answer_lower.__contains__
+
     for topic in expected_topics:
-        if topic.lower() in answer_lower:
+        if is_mentioned(topic.lower()):
             found_topics.append(topic)
         else:
             missing_topics.append(topic)
@@ -120,10 +168,14 @@ def calculate_topic_coverage(answer: str, expected_topics: list) -> tuple:
     return coverage, found_topics, missing_topics
 
 
-def evaluate_response_quality(answer: str) -> dict:
+def evaluate_response_quality(answer: str, answer_lower: str = None) -> dict:
     """
     Evaluate response quality based on structure and content.
+    Pass answer_lower if the caller has already lowercased the answer.
     """
+    if answer_lower is None:
+        answer_lower = answer.lower()
+
     quality = {
         "has_structure": False,
         "has_citations": False,
@@ -133,17 +185,17 @@ def evaluate_response_quality(answer: str) -> dict:
     }
 
     # Check for structured formatting
-    if any(marker in answer for marker in ["##", "**", "1.", "- ", "* "]):
+    if _STRUCTURE_RE.search(answer):
         quality["has_structure"] = True
         quality["score"] += 0.25
 
     # Check for regulation citations
-    if any(marker in answer.upper() for marker in ["CFR", "MSHA", "OSHA", "30 CFR"]):
+    if _CITATION_RE.search(answer_lower):
         quality["has_citations"] = True
         quality["score"] += 0.25
 
     # Check for action items or recommendations
-    if any(marker in answer.lower() for marker in ["recommend", "action", "should", "must", "required"]):
+    if _ACTION_RE.search(answer_lower):
         quality["has_action_items"] = True
         quality["score"] += 0.25
 
@@ -185,6 +237,78 @@ def test_intent_detection():
     return passed == len(test_cases)
 
 
+# Test cases run against the agent at once
+MAX_CONCURRENT_TESTS = 4
+
+
+def _run_single(agent, test_case: dict) -> tuple:
+    """
+    Invoke the agent on one test case and score the answer.
+    Returns (result, answer); answer is None if the invocation failed.
+    """
+    try:
+        # Invoke agent
+        response = agent.invoke({
+            "messages": [HumanMessage(content=test_case['question'])]
+        })
+        answer = response["messages"][-1].content
+        # Lowercased once for both the coverage and the quality checks
+        answer_lower = answer.lower()
+
+        # Calculate metrics
+        coverage, found, missing = calculate_topic_coverage(
+            answer, test_case['expected_topics'], answer_lower
+        )
+        quality = evaluate_response_quality(answer, answer_lower)
+
+        # Combined score
+        combined_score = (coverage * 0.6) + (quality["score"] * 0.4)
+        passed = combined_score >= 0.5
+
+        result = {
+            "test_id": test_case['id'],
+            "category": test_case['category'],
+            "question": test_case['question'],
+            "coverage_score": coverage,
+            "topics_found": found,
+            "topics_missing": missing,
+            "quality": quality,
+            "combined_score": combined_score,
+            "passed": passed
+        }
+        return result, answer
+
+    except Exception as e:
+        return {
+            "test_id": test_case['id'],
+            "category": test_case['category'],
+            "error": str(e),
+            "passed": False
+        }, None
+
+
+def _print_result(test_case: dict, result: dict, answer: str, verbose: bool):
+    """Print one test's outcome."""
+    print(f"\n[Test {test_case['id']}] {test_case['category']}")
+    print(f"  Question: {test_case['question'][:60]}...")
+    print(f"  Expected summary request: {test_case['is_summary']}")
+
+    if "error" in result:
+        print(f"  ERROR: {result['error']}")
+        return
+
+    status = "PASS" if result['passed'] else "FAIL"
+    print(f"  Result: [{status}]")
+    print(f"    Topic Coverage: {result['coverage_score']*100:.0f}% ({len(result['topics_found'])}/{len(test_case['expected_topics'])})")
+    print(f"    Quality Score: {result['quality']['score']*100:.0f}%")
+    print(f"    Combined Score: {result['combined_score']*100:.0f}%")
+
+    if verbose:
+        print(f"    Found: {result['topics_found']}")
+        print(f"    Missing: {result['topics_missing']}")
+        print(f"    Answer preview: {answer[:200]}...")
+
+
 def run_evaluation(collection_name: str = "test_evaluation_kb", verbose: bool = False, test_id: int = None):
     """
     Run the full evaluation suite.
@@ -218,61 +342,18 @@ def run_evaluation(collection_name: str = "test_evaluation_kb", verbose: bool =
     results = []
     test_data = EVAL_DATA if test_id is None else [t for t in EVAL_DATA if t["id"] == test_id]
 
+    # Each test mostly waits on the LLM and the vector store, so the tests
+    # run on threads; results are printed in test order once all are done
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_TESTS, len(test_data)))) as pool:
+        futures = {pool.submit(_run_single, agent, test_case): test_case for test_case in test_data}
+        for future in as_completed(futures):
+            outcomes[futures[future]['id']] = future.result()
+
     for test_case in test_data:
-        print(f"\n[Test {test_case['id']}] {test_case['category']}")
-        print(f"  Question: {test_case['question'][:60]}...")
-        print(f"  Expected summary request: {test_case['is_summary']}")
-
-        try:
-            # Invoke agent
-            response = agent.invoke({
-                "messages": [HumanMessage(content=test_case['question'])]
-            })
-            answer = response["messages"][-1].content
-
-            # Calculate metrics
-            coverage, found, missing = calculate_topic_coverage(
-                answer, test_case['expected_topics']
-            )
-            quality = evaluate_response_quality(answer)
-
-            # Combined score
-            combined_score = (coverage * 0.6) + (quality["score"] * 0.4)
-            passed = combined_score >= 0.5
-
-            result = {
-                "test_id": test_case['id'],
-                "category": test_case['category'],
-                "question": test_case['question'],
-                "coverage_score": coverage,
-                "topics_found": found,
-                "topics_missing": missing,
-                "quality": quality,
-                "combined_score": combined_score,
-                "passed": passed
-            }
-            results.append(result)
-
-            # Print results
-            status = "PASS" if passed else "FAIL"
-            print(f"  Result: [{status}]")
-            print(f"    Topic Coverage: {coverage*100:.0f}% ({len(found)}/{len(test_case['expected_topics'])})")
-            print(f"    Quality Score: {quality['score']*100:.0f}%")
-            print(f"    Combined Score: {combined_score*100:.0f}%")
-
-            if verbose:
-                print(f"    Found: {found}")
-                print(f"    Missing: {missing}")
-                print(f"    Answer preview: {answer[:200]}...")
-
-        except Exception as e:
-            print(f"  ERROR: {e}")
-            results.append({
-                "test_id": test_case['id'],
-                "category": test_case['category'],
-                "error": str(e),
-                "passed": False
-            })
+        result, answer = outcomes[test_case['id']]
+        results.append(result)
+        _print_result(test_case, result, answer, verbose)
 
     # Summary
     print("\n" + "=" * 60)
@@ -280,9 +361,15 @@ def run_evaluation(collection_name: str = "test_evaluation_kb", verbose: bool =
     print("=" * 60)
 
     total_tests = len(results)
-    passed_tests = sum(1 for r in results if r.get('passed', False))
-    avg_coverage = sum(r.get('coverage_score', 0) for r in results) / total_tests if total_tests > 0 else 0
-    avg_quality = sum(r.get('quality', {}).get('score', 0) for r in results) / total_tests if total_tests > 0 else 0
+    passed_tests = 0
+    total_coverage = 0
+    total_quality = 0
+    for r in results:
+        passed_tests += r.get('passed', False)
+        total_coverage += r.get('coverage_score', 0)
+        total_quality += r.get('quality', {}).get('score', 0)
+    avg_coverage = total_coverage / total_tests if total_tests > 0 else 0
+    avg_quality = total_quality / total_tests if total_tests > 0 else 0
 
     print(f"Tests Passed: {passed_tests}/{total_tests}")
     print(f"Average Topic Coverage: {avg_coverage*100:.1f}%")